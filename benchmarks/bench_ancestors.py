@@ -0,0 +1,67 @@
+"""
+Benchmark of the ancestor queries and reorgs of Block
+
+For chains of increasing length, reports the time of ancestor_at against a walk along prevblock, and the
+time of a reorg of --depth blocks (Block.reorg_path and Mempool.reorg), which should not get slower with
+the length of the chain.
+
+python3 benchmarks/bench_ancestors.py --lengths 1000 10000 100000 --depth 3
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from block import Block
+from mempool import Mempool
+
+
+def chain(length):
+    block = Block(None, 0, set(), -1)
+    blocks = [block]
+    for i in range(length):
+        block = Block(block, i + 1, set(), i % 10)
+        blocks.append(block)
+    return blocks
+
+
+def walk_ancestor(block, height):
+    while block.height > height:
+        block = block.prevblock
+    return block
+
+
+def timed(function, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start)/repeats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lengths", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--depth", type=int, default=3, help="blocks that leave the chain in the reorg")
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(0)
+    print(f"{'length':>8} {'walk (us)':>10} {'ancestor_at (us)':>17} {'reorg (us)':>11}")
+    for length in args.lengths:
+        blocks = chain(length)
+        tip = blocks[-1]
+        heights = [random.randint(0, length) for _ in range(args.repeats)]
+        walk = timed(lambda: [walk_ancestor(tip, h) for h in heights], 1)/len(heights)
+        skip = timed(lambda: [tip.ancestor_at(h) for h in heights], 1)/len(heights)
+
+        # A competing branch one block longer than the depth blocks it replaces
+        fork = blocks[-1 - args.depth]
+        branch = fork
+        for i in range(args.depth + 1):
+            branch = Block(branch, length + i + 1, set(), 99)
+        mempool = Mempool()
+        reorg = timed(lambda: mempool.reorg(*tip.reorg_path(branch)), args.repeats)
+        print(f"{length:>8} {1e6*walk:>10.1f} {1e6*skip:>17.2f} {1e6*reorg:>11.2f}")
@@ -0,0 +1,87 @@
+"""
+Memory benchmark of the peers' block trees: one shared BlockTree with per-peer arrival times against a
+map of tree nodes per peer
+
+Both variants record the same random tree of --blocks blocks, seen by all the --n peers, and report the
+peak traced memory of the tree bookkeeping (the blocks themselves are allocated before tracing starts).
+
+python3 benchmarks/bench_block_tree.py --n 100 --blocks 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from block import Block
+from tree import BlockTree
+
+
+class Node:
+    # The previous representation: every peer keeps its own node per block with a list of child blkids
+    def __init__(self, block, timestamp):
+        self.block = block
+        self.timestamp = timestamp
+        self.children = []
+
+
+def make_blocks(count):
+    genesis = Block(None, 0, set([]), -1)
+    blocks = [genesis]
+    for height in range(1, count + 1):
+        # Mostly extend one of the last few blocks so the tree has some forks
+        parent = blocks[max(0, len(blocks) - 1 - int(random.expovariate(2)))]
+        blocks.append(Block(parent, float(height), set([]), height))
+    return blocks
+
+
+def run_shared(blocks, n):
+    block_tree = BlockTree(blocks[0])
+    arrivals = [{0: 0.0} for _ in range(n)]
+    for block in blocks[1:]:
+        index = block_tree.add(block)
+        for peer in range(n):
+            if index not in arrivals[peer]:
+                arrivals[peer][index] = block.timestamp + peer
+    return block_tree, arrivals
+
+
+def run_node_maps(blocks, n):
+    maps = [{blocks[0].blkid: Node(blocks[0], 0.0)} for _ in range(n)]
+    for block in blocks[1:]:
+        for peer in range(n):
+            parent = maps[peer][block.prevblock.blkid]
+            node = Node(block, block.timestamp + peer)
+            if block.blkid not in parent.children:
+                parent.children.append(block.blkid)
+            maps[peer][block.blkid] = node
+    return maps
+
+
+def measure(function, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=100)
+    parser.add_argument("--blocks", type=int, default=5000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    blocks = make_blocks(args.blocks)
+
+    print(f"{'variant':>10} {'peak (MB)':>10} {'time (s)':>9}")
+    for name, function in (("shared", run_shared), ("node maps", run_node_maps)):
+        peak, elapsed = measure(function, blocks, args.n)
+        print(f"{name:>10} {peak/2**20:>10.1f} {elapsed:>9.2f}")
@@ -0,0 +1,84 @@
+"""
+Comparison of the serial and fan-out broadcast modes
+
+Runs the same configuration and seed in both modes and reports the wall-clock events/sec,
+the number of SimPy processes created and the distribution of the block propagation delay
+(arrival time at a peer minus the time the miner added the block to its own tree).
+
+python3 benchmarks/bench_broadcast.py --n 50 --Ttx 1000 --I 600 --time 30000
+"""
+import contextlib
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simpy
+import run
+
+
+class CountingEnvironment(simpy.Environment):
+    """
+    SimPy environment counting the processes it creates
+    """
+    def __init__(self):
+        super().__init__()
+        self.processes = 0
+
+    def process(self, generator):
+        self.processes += 1
+        return super().process(generator)
+
+
+def propagation_delays(peers):
+    delays = []
+    block_tree = peers[0].block_tree
+    for miner in peers:
+        for index, mined in miner.arrivals.items():
+            if block_tree.blocks[index].userid != miner.id:
+                continue
+            for peer in peers:
+                if peer is not miner and index in peer.arrivals:
+                    delays.append(peer.arrivals[index] - mined)
+    return delays
+
+
+def simulate(args, seed):
+    random.seed(seed)
+    env = CountingEnvironment()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        env, peers, network = run.build_simulation(args, env)
+        events = 0
+        start = time.perf_counter()
+        while env.peek() < args.time:
+            env.step()
+            events += 1
+        elapsed = time.perf_counter() - start
+    return events, elapsed, env.processes, propagation_delays(peers)
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q*len(values)))]
+
+
+if __name__ == "__main__":
+    parser_args = sys.argv[1:]
+    seed = 0
+    if "--seed" in parser_args:
+        i = parser_args.index("--seed")
+        seed = int(parser_args[i + 1])
+        del parser_args[i:i + 2]
+
+    print(f"{'mode':>7} {'events':>9} {'events/s':>10} {'processes':>10} {'blocks seen':>12} {'p50 (ms)':>9} {'p90 (ms)':>9} {'max (ms)':>9}")
+    for mode in ("serial", "fanout"):
+        args = run.parse_args(parser_args + ["--broadcast", mode])
+        events, elapsed, processes, delays = simulate(args, seed)
+        mean = statistics.mean(delays) if delays else float("nan")
+        print(f"{mode:>7} {events:>9} {events/elapsed:>10.0f} {processes:>10} {len(delays):>12} "
+              f"{percentile(delays, 0.5):>9.1f} {percentile(delays, 0.9):>9.1f} {max(delays, default=float('nan')):>9.1f}   mean {mean:.1f}")
@@ -0,0 +1,98 @@
+"""
+Benchmark of the mining-candidate selection in Peer.create_block as the chain grows
+
+Builds a chain of --height blocks with --per-block transactions each. The peer holds --mempool
+pending transactions plus the ones included in the last --window blocks, so the mempool size
+stays fixed and only the chain grows. Peer.select_transactions (sampling the mempool) is timed at
+several heights, alongside filtering a set of transactions with Block.includes and the old approach
+(set difference against get_all_transactions) for reference.
+
+python3 benchmarks/bench_create_block.py --height 20000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simpy
+from block import Block
+from ledger import Ledger
+from peer import Peer
+from transaction import Transaction
+
+
+def make_transactions(count, start, sender, receiver):
+    return [Transaction(start + i, sender, receiver, 1, 0) for i in range(count)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="create_block candidate selection benchmark")
+    parser.add_argument("--height", type=int, default=20000, help="final chain height")
+    parser.add_argument("--per-block", type=int, default=5, help="transactions per block")
+    parser.add_argument("--mempool", type=int, default=2000, help="pending transactions at the peer")
+    parser.add_argument("--window", type=int, default=100, help="recent blocks whose transactions stay in the mempool")
+    parser.add_argument("--repeat", type=int, default=5, help="timed calls per checkpoint")
+    parser.add_argument("--old-limit", type=int, default=20000, help="skip the old approach above this height")
+    args = parser.parse_args()
+
+    random.seed(0)
+    env = simpy.Environment()
+    genesis = Block(None, 0, set([]), -1)
+    # Enough coins for the transactions of the first block, the mining rewards pay for the next ones
+    genesis.ledger = Ledger(None, {0: args.per_block, 1: 0})
+    peer = Peer(0, genesis, env, {"speed": "fast", "cpu": "high", "hashing power": 1})
+    other = Peer(1, genesis, env, {"speed": "fast", "cpu": "high", "hashing power": 1})
+
+    # Pending transactions that are never included
+    pool = set(make_transactions(args.mempool, 0, peer.id, other.id))
+    for t in pool:
+        peer.mempool.add(t)
+    next_id = args.mempool
+
+    checkpoints = [h for h in (100, 1000, 5000, 10000, 20000, 50000) if h <= args.height]
+    if args.height not in checkpoints:
+        checkpoints.append(args.height)
+
+    print(f"{'height':>8} {'select (ms)':>12} {'includes (ms)':>14} {'old (ms)':>10}")
+    block = genesis
+    for height in range(1, args.height + 1):
+        transactions = make_transactions(args.per_block, next_id, peer.id, other.id)
+        next_id += args.per_block
+        pool.update(transactions)
+        if height > args.window:
+            old = block
+            for _ in range(args.window - 1):
+                old = old.prevblock
+            pool -= old.transactions
+        for t in transactions:
+            peer.add_transaction(t)
+        block = Block(block, height, set(transactions), 0)
+        if not block.validate(): # Validated before it becomes the longest chain, as in a run
+            sys.exit(f"The block at height {height} is invalid")
+        peer.set_longest_chain(block)
+        block.get_tx_index() # Indexed as it becomes the longest chain, as in a run
+
+        if height in checkpoints:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                peer.select_transactions()
+            new_ms = (time.perf_counter() - start)*1000/args.repeat
+
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                valid = [t for t in pool if not block.includes(t)]
+                random.sample(valid, random.randint(0, min(len(valid), 999)))
+            includes_ms = (time.perf_counter() - start)*1000/args.repeat
+
+            old_ms = float("nan")
+            if height <= args.old_limit:
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    valid = pool - block.get_all_transactions()
+                    random.sample(list(valid), random.randint(0, min(len(valid), 999)))
+                old_ms = (time.perf_counter() - start)*1000/args.repeat
+
+            print(f"{height:>8} {new_ms:>12.3f} {includes_ms:>14.3f} {old_ms:>10.3f}")
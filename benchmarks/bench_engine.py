@@ -0,0 +1,162 @@
+"""
+Comparison of the heap-based Engine with simpy
+
+First a microbenchmark of the cost of one message hop in each engine: a chain of nested processes
+as in the serial mode (forward -> send -> receive), a timeout with a callback as in the fan-out
+mode on simpy, and a heap entry in Engine.
+
+Then the same configuration is run end to end for --seeds seeds in the serial and fan-out modes,
+each on simpy and on the heap engine, reporting the messages (transaction and block arrivals)
+delivered per wall-clock second and the speedup over the serial simpy mode. On both engines a mode
+schedules the same events in the same order, so the aggregate statistics of the heap engine must be
+identical to the simpy ones of the same mode; the script exits with an error if not. The two modes
+are different models (in the serial one a peer waits for the whole relay by a neighbor, and for its
+next block when it mines one, before sending to the next neighbor), so their statistics differ.
+
+python3 benchmarks/bench_engine.py --n 10 --z0 0.9 --z1 0.1 --Ttx 1000000 --I 6000 --time 2880000 --seeds 5
+"""
+import contextlib
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simpy
+import run
+from block import validation_cache
+from transaction import tx_ids
+from engine import Engine, SimpyScheduler, TX_ARRIVAL, BLOCK_ARRIVAL
+from peer import Peer
+
+
+def hop_processes(hops):
+    env = simpy.Environment()
+
+    def receive(k):
+        if k < hops:
+            yield env.process(forward(k + 1))
+
+    def send(k):
+        yield env.timeout(1)
+        yield env.process(receive(k))
+
+    def forward(k):
+        yield env.process(send(k))
+
+    env.process(forward(0))
+    env.run()
+
+
+def hop_scheduler(scheduler, hops, run):
+    def receive(k):
+        if k < hops:
+            scheduler.schedule(1, TX_ARRIVAL, receive, (k + 1,))
+
+    scheduler.schedule(1, TX_ARRIVAL, receive, (0,))
+    run()
+
+
+def microbenchmark(hops):
+    print(f"{'hop cost':>14} {'hops/s':>10}")
+    env = simpy.Environment()
+    engine = Engine()
+    for name, function in (("simpy process", lambda: hop_processes(hops)),
+                           ("simpy callback", lambda: hop_scheduler(SimpyScheduler(env), hops, env.run)),
+                           ("heap engine", lambda: hop_scheduler(engine, hops, lambda: engine.run(float("inf"))))):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        print(f"{name:>14} {hops/elapsed:>10.0f}")
+
+
+def statistics(peers):
+    """
+    Aggregate statistics of a run that do not depend on the engine
+    """
+    return {
+        "blocks created": sum(peer.num_gen for peer in peers),
+        "blocks in trees": sum(len(peer.arrivals) for peer in peers),
+        "longest chains": [(peer.longest_chain.height, peer.longest_chain.userid, peer.longest_chain.timestamp) for peer in peers],
+        "pending transactions": sum(len(peer.mempool) for peer in peers),
+        "balances": [peer.balance for peer in peers],
+    }
+
+
+def simulate(argv, seed):
+    args = run.parse_args(argv)
+    random.seed(seed)
+    validation_cache.reset()
+    tx_ids.reset()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        env, peers, network = run.build_simulation(args)
+        if args.broadcast == "serial":
+            # Count the arrivals in the serial mode by wrapping the receive generators
+            arrivals = [0]
+            for name in ("receive_transaction", "receive_block"):
+                def counted(self, *a, _method=getattr(Peer, name)):
+                    arrivals[0] += 1
+                    return _method(self, *a)
+                for peer in peers:
+                    setattr(peer, name, counted.__get__(peer))
+        start = time.perf_counter()
+        env.run(until=args.time)
+        elapsed = time.perf_counter() - start
+        if args.broadcast == "serial":
+            messages = arrivals[0]
+        else:
+            messages = network.scheduler.counts[TX_ARRIVAL] + network.scheduler.counts[BLOCK_ARRIVAL]
+    return messages, elapsed, statistics(peers)
+
+
+MODES = {
+    "simpy serial": ["--broadcast", "serial"],
+    "heap serial": ["--engine", "heap", "--broadcast", "serial"],
+    "simpy fan-out": ["--broadcast", "fanout"],
+    "heap fan-out": ["--engine", "heap", "--broadcast", "fanout"],
+}
+
+# Runs that must give the same statistics
+PAIRS = [("simpy serial", "heap serial"), ("simpy fan-out", "heap fan-out")]
+
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    options = {"--seed": "0", "--seeds": "1"}
+    for option in options:
+        if option in argv:
+            i = argv.index(option)
+            options[option] = argv[i + 1]
+            del argv[i:i + 2]
+    seeds = range(int(options["--seed"]), int(options["--seed"]) + int(options["--seeds"]))
+
+    microbenchmark(200000)
+    print()
+
+    # Messages and wall time over all the seeds, statistics per seed
+    results = {}
+    for name, extra in MODES.items():
+        runs = [simulate(argv + extra, seed) for seed in seeds]
+        results[name] = (sum(run[0] for run in runs), sum(run[1] for run in runs), [run[2] for run in runs])
+
+    base = results["simpy serial"]
+    print(f"{'mode':>14} {'messages':>9} {'wall (s)':>9} {'messages/s':>11} {'speedup':>8}")
+    for name, (messages, elapsed, _) in results.items():
+        print(f"{name:>14} {messages:>9} {elapsed:>9.2f} {messages/elapsed:>11.0f} {messages/elapsed/(base[0]/base[1]):>8.2f}")
+
+    mismatches = 0
+    for simpy_mode, heap_mode in PAIRS:
+        expected = results[simpy_mode]
+        result = results[heap_mode]
+        if result[0] != expected[0] or result[2] != expected[2]:
+            mismatches += 1
+            for seed, stats, expected_stats in zip(seeds, result[2], expected[2]):
+                for key in stats:
+                    if stats[key] != expected_stats[key]:
+                        print(f"seed {seed}: mismatch in {key}")
+            print(f"{heap_mode} and {simpy_mode} runs differ")
+        else:
+            print(f"{heap_mode} and {simpy_mode} runs match")
+    if mismatches:
+        sys.exit(1)
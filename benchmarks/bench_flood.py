@@ -0,0 +1,69 @@
+"""
+Comparison of the hop by hop and analytic transaction gossip
+
+Runs the same configuration and seed on the heap engine with --tx-gossip flood and analytic, and
+reports the transaction arrival events, the wall time and the distribution of the delay from the
+generation of a transaction to its first arrival at every other peer. The analytic mode takes the
+mean queueing delay on every link instead of a draw per message, so the delays are close but not
+the same.
+
+python3 benchmarks/bench_flood.py --n 1000 --Ttx 20000 --I 1e12 --time 2000
+"""
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import run
+from block import validation_cache
+from transaction import tx_ids
+from engine import TX_ARRIVAL
+from peer import Peer
+
+
+def simulate(args):
+    random.seed(args.seed)
+    validation_cache.reset()
+    tx_ids.reset()
+
+    # First arrival of every transaction at every peer
+    delays = []
+    seen = set()
+    add_transaction = Peer.add_transaction
+
+    def recorded(peer, transaction):
+        if (peer.id, transaction.id) not in seen:
+            seen.add((peer.id, transaction.id))
+            delays.append(peer.env.now - transaction.timestamp)
+        add_transaction(peer, transaction)
+
+    Peer.add_transaction = recorded
+    try:
+        env, peers, network = run.build_simulation(args)
+        start = time.perf_counter()
+        env.run(until=args.time)
+        wall = time.perf_counter() - start
+    finally:
+        Peer.add_transaction = add_transaction
+    return wall, env.counts[TX_ARRIVAL], delays
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q*len(values)))] if values else float("nan")
+
+
+if __name__ == "__main__":
+    parser_args = sys.argv[1:]
+    if "--seed" not in parser_args:
+        parser_args += ["--seed", "1"]
+
+    print(f"{'mode':>9} {'tx arrivals':>12} {'wall (s)':>9} {'arrivals':>9} {'mean (ms)':>10} {'p50 (ms)':>9} {'p90 (ms)':>9} {'max (ms)':>9}")
+    for mode in ("flood", "analytic"):
+        args = run.parse_args(parser_args + ["--engine", "heap", "--tx-gossip", mode])
+        wall, events, delays = simulate(args)
+        print(f"{mode:>9} {events:>12} {wall:>9.2f} {len(delays):>9} {statistics.mean(delays) if delays else float('nan'):>10.1f} "
+              f"{percentile(delays, 0.5):>9.1f} {percentile(delays, 0.9):>9.1f} {max(delays, default=float('nan')):>9.1f}")
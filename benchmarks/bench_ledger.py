@@ -0,0 +1,126 @@
+"""
+Memory benchmark of the per-block balances: delta-encoded Ledger against a full dict copy per block
+
+Both variants apply the same --per-block random transfers on a chain of --blocks blocks over --n peers
+and report the peak traced memory. The dict-copy variant is run on --copy-blocks blocks only (a full
+run at the default size needs several GB) and its peak is extrapolated linearly to --blocks.
+Both also report the mean time of --lookups balance lookups on random blocks of their chain.
+
+python3 benchmarks/bench_ledger.py --n 5000 --blocks 20000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from block import Block, validation_cache
+from ledger import Ledger
+from transaction import Transaction
+
+
+class User:
+    def __init__(self, id):
+        self.id = id
+
+
+def make_transactions(users, count, next_id):
+    transactions = set()
+    for i in range(count):
+        sender, receiver = random.sample(users, 2)
+        transactions.add(Transaction(next_id + i, sender.id, receiver.id, random.randint(1, 5), 0))
+    return transactions
+
+
+def run_ledger(users, blocks, per_block, validate=True):
+    genesis = Block(None, 0, set([]), -1)
+    genesis.ledger = Ledger(None, {u.id: 1000 for u in users})
+    block = genesis
+    for height in range(1, blocks + 1):
+        block = Block(block, height, make_transactions(users, per_block, height*per_block), height % len(users))
+        if validate:
+            assert block.validate()
+    return block
+
+
+def run_dict_copy(users, blocks, per_block):
+    # The previous representation: every block copies the parent's balances and applies its transactions
+    balances = {u.id: 1000 for u in users}
+    chain = [balances]
+    for height in range(1, blocks + 1):
+        transactions = make_transactions(users, per_block, height*per_block)
+        balances = balances.copy()
+        for t in transactions:
+            balances[t.sender] -= t.amount
+            balances[t.receiver] += t.amount
+        balances[height % len(users)] += 50
+        chain.append(balances)
+    return chain
+
+
+def time_lookups(chain, users, lookups, balance_of):
+    """
+    Returns the mean time in seconds of a balance lookup of a random user on a random block of chain
+    balance_of: function(chain entry, user id) returning the balance
+    """
+    random.seed(1)
+    queries = [(random.choice(chain), random.choice(users).id) for _ in range(lookups)]
+    start = time.perf_counter()
+    for entry, id in queries:
+        balance_of(entry, id)
+    return (time.perf_counter() - start)/lookups
+
+
+def ledgers_of(block):
+    chain = []
+    while block is not None:
+        chain.append(block.ledger)
+        block = block.prevblock
+    return chain
+
+
+def measure(function, *args, **kwargs):
+    random.seed(0)
+    validation_cache.reset() # The ledgers of an earlier run would be reused and kept alive
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return peak, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ledger memory benchmark")
+    parser.add_argument("--n", type=int, default=5000, help="number of peers")
+    parser.add_argument("--blocks", type=int, default=20000, help="chain length")
+    parser.add_argument("--copy-blocks", type=int, default=1000, help="chain length for the dict-copy variant")
+    parser.add_argument("--per-block", type=int, default=10, help="transactions per block")
+    parser.add_argument("--lookups", type=int, default=200000, help="number of timed balance lookups")
+    args = parser.parse_args()
+
+    users = [User(i) for i in range(args.n)]
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 4*args.blocks)) # Freeing a long chain of blocks recurses
+
+    copy_blocks = min(args.copy_blocks, args.blocks)
+    copy_peak, copy_time = measure(run_dict_copy, users, copy_blocks, args.per_block)
+    ledger_peak, ledger_time = measure(run_ledger, users, args.blocks, args.per_block)
+    chain_peak, _ = measure(run_ledger, users, args.blocks, args.per_block, validate=False)
+    copy_estimate = copy_peak*args.blocks/copy_blocks
+
+    random.seed(0)
+    copy_lookup = time_lookups(run_dict_copy(users, copy_blocks, args.per_block), users, args.lookups, dict.get)
+    random.seed(0)
+    validation_cache.reset()
+    ledger_lookup = time_lookups(ledgers_of(run_ledger(users, args.blocks, args.per_block)), users, args.lookups, Ledger.balance_of)
+    ledger_only = ledger_peak - chain_peak
+
+    print(f"dict copy : {copy_peak/2**20:10.1f} MiB peak for {copy_blocks} blocks ({copy_time:.2f} s), ~{copy_estimate/2**20:.1f} MiB for {args.blocks}")
+    print(f"ledger    : {ledger_peak/2**20:10.1f} MiB peak for {args.blocks} blocks ({ledger_time:.2f} s), of which {chain_peak/2**20:.1f} MiB are the blocks and transactions")
+    print(f"reduction : {copy_estimate/ledger_only:.1f}x on the balances alone")
+    print(f"lookup    : {ledger_lookup*1e6:.2f} us per balance with the ledger, {copy_lookup*1e6:.2f} us with dict copies")
@@ -0,0 +1,64 @@
+"""
+Benchmark of a quiet run against a verbose one
+
+Runs the same configuration and seed with DEBUG logging written to --output (every event, as the
+old print() calls did), with WARNING logging (hot-path log calls disabled), and with WARNING
+logging plus the JSON-lines event trace.
+
+python3 benchmarks/bench_logging.py --n 10 --z0 0.9 --z1 0.1 --Ttx 1000000 --I 6000 --time 2880000
+"""
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import run
+from block import validation_cache
+from eventlog import event_trace
+
+
+def simulate(argv, seed, level, output, trace_file=None):
+    args = run.parse_args(argv)
+    random.seed(seed)
+    validation_cache.reset()
+
+    root = logging.getLogger()
+    handler = logging.StreamHandler(output)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    root.addHandler(handler)
+    root.setLevel(level)
+    if trace_file is not None:
+        event_trace.open(trace_file)
+    try:
+        env, peers, network = run.build_simulation(args)
+        start = time.perf_counter()
+        env.run(until=args.time)
+        event_trace.close()
+        elapsed = time.perf_counter() - start
+    finally:
+        root.removeHandler(handler)
+    return elapsed
+
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    output_name = os.devnull
+    if "--output" in argv:
+        i = argv.index("--output")
+        output_name = argv[i + 1]
+        del argv[i:i + 2]
+
+    with open(output_name, "w") as output, tempfile.TemporaryDirectory() as directory:
+        verbose = simulate(argv, 0, logging.DEBUG, output)
+        quiet = simulate(argv, 0, logging.WARNING, output)
+        trace_file = os.path.join(directory, "trace.jsonl")
+        traced = simulate(argv, 0, logging.WARNING, output, trace_file)
+        trace_size = os.path.getsize(trace_file)
+
+    print(f"verbose (DEBUG)       : {verbose:7.2f} s")
+    print(f"quiet (WARNING)       : {quiet:7.2f} s  {verbose/quiet:.1f}x faster")
+    print(f"quiet + event trace   : {traced:7.2f} s  ({trace_size/2**20:.1f} MiB trace)")
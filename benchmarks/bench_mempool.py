@@ -0,0 +1,52 @@
+"""
+Benchmark of adding transactions to a full mempool, each add evicting the oldest pending transaction
+
+For every capacity, fills a mempool to capacity, then times --adds more adds (and so as many
+evictions), with some discards in between as when blocks confirm transactions. The cost per add must
+not grow with the capacity; the script exits with an error if the largest capacity is more than
+--threshold times slower per add than the smallest one (the larger dicts miss the CPU caches more
+often, so the times are not exactly flat).
+
+python3 benchmarks/bench_mempool.py --capacities 1000 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mempool import Mempool
+from transaction import Transaction
+
+
+def time_adds(capacity, adds):
+    """
+    Returns the time per add to a full mempool of capacity transactions, in seconds
+    """
+    mempool = Mempool(capacity)
+    for i in range(capacity):
+        mempool.add(Transaction(i, i % 100, (i + 1) % 100, 1, i))
+    transactions = [Transaction(capacity + i, i % 100, (i + 1) % 100, 1, capacity + i) for i in range(adds)]
+    start = time.perf_counter()
+    for i, transaction in enumerate(transactions):
+        mempool.add(transaction)
+        if i % 10 == 0:
+            mempool.discard(capacity + i - 5) # Confirmed by a block
+    return (time.perf_counter() - start)/adds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--capacities", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--adds", type=int, default=200000, help="timed adds per capacity")
+    parser.add_argument("--threshold", type=float, default=3.0, help="largest slowdown per add allowed across capacities")
+    args = parser.parse_args()
+
+    print(f"{'capacity':>9} {'add + evict (us)':>17}")
+    times = []
+    for capacity in args.capacities:
+        times.append(time_adds(capacity, args.adds))
+        print(f"{capacity:>9} {1e6*times[-1]:>17.2f}")
+    if max(times) > args.threshold*times[0]:
+        sys.exit(f"adding to a full mempool gets slower with the capacity ({max(times)/times[0]:.1f}x)")
@@ -0,0 +1,58 @@
+"""
+Benchmark of Network.init_properties: time and memory of the link properties at several network sizes
+
+The neighbor lists are generated directly (4 to 8 random neighbors per peer) so that only the
+link property initialization is measured.
+
+python3 benchmarks/bench_network.py --sizes 1000 10000 50000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from network import Network
+
+
+class Node:
+    def __init__(self, id, speed):
+        self.id = id
+        self.speed = speed
+        self.neighbors = []
+
+
+def random_peers(n):
+    peers = [Node(i, random.choice(["slow", "fast"])) for i in range(n)]
+    for peer in peers:
+        for _ in range(random.randint(4, 8)):
+            other = peers[random.randrange(n)]
+            if other is not peer:
+                peer.neighbors.append(other)
+                other.neighbors.append(peer)
+    return peers
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Network link properties benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000], help="network sizes")
+    args = parser.parse_args()
+
+    random.seed(0)
+    print(f"{'peers':>8} {'edges':>9} {'init (s)':>9} {'memory (MiB)':>13} {'bytes/edge':>11}")
+    for n in args.sizes:
+        network = Network.__new__(Network)
+        network.peers = random_peers(n)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        network.init_properties()
+        elapsed = time.perf_counter() - start
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        edges = len(network.p)
+        print(f"{n:>8} {edges:>9} {elapsed:>9.2f} {memory/2**20:>13.1f} {memory/edges:>11.1f}")
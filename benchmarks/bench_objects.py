@@ -0,0 +1,119 @@
+"""
+Memory and allocation benchmark of transactions and blocks: slotted objects with integer ids against
+the previous dict-backed objects referencing peers and hashing strings for the ids
+
+Both variants create --transactions transactions between --n peers and pack them in blocks of --per-block
+transactions on a single chain. Reported per transaction and per block: the traced memory that stays
+allocated, the number of allocated memory blocks and the creation time.
+
+python3 benchmarks/bench_objects.py --transactions 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from block import Block
+from transaction import Transaction
+
+
+class User:
+    def __init__(self, id):
+        self.id = id
+
+
+class OldTransaction:
+    # The previous representation: a __dict__ per transaction and references to the peers
+    def __init__(self, id, sender, receiver, amount, timestamp):
+        self.id = id
+        self.sender = sender
+        self.receiver = receiver
+        self.amount = amount
+        self.timestamp = timestamp
+
+    def __str__(self):
+        return f"{self.id}: {self.sender.id} pays {self.receiver.id} {self.amount} coins"
+
+
+class OldBlock:
+    # The previous representation: a __dict__ per block and an id hashed from the string of all its transactions
+    def __init__(self, prevblock, timestamp, transactions, userid):
+        self.prevblock = prevblock
+        self.timestamp = timestamp
+        self.transactions = transactions
+        self.userid = userid
+
+        trans_string = ""
+        for transaction in transactions:
+            trans_string += str(transaction) + " "
+
+        if prevblock == None:
+            self.ledger = None
+            self.height = 0
+            self.blkid = hash(str(timestamp))
+        else:
+            self.ledger = None
+            self.height = self.prevblock.height + 1
+            self.blkid = hash(str(prevblock.blkid) + str(timestamp) + str(trans_string) + str(userid))
+        self.tx_index = None
+        self.size = 8*(len(transactions) + 1)
+
+
+def new_transactions(count, n):
+    pairs = [random.sample(range(n), 2) for _ in range(count)]
+    return [Transaction(id, sender, receiver, 1, float(id)) for id, (sender, receiver) in enumerate(pairs)]
+
+
+def old_transactions(count, n):
+    users = [User(i) for i in range(n)]
+    pairs = [random.sample(users, 2) for _ in range(count)]
+    return [OldTransaction(hash(str(sender.id) + str(receiver.id) + str(float(id))), sender, receiver, 1, float(id))
+            for id, (sender, receiver) in enumerate(pairs)]
+
+
+def make_chain(block_class, transactions, per_block):
+    block = block_class(None, 0, set([]), -1)
+    chain = [block]
+    for start in range(0, len(transactions), per_block):
+        block = block_class(block, float(start), set(transactions[start:start + per_block]), start % 7)
+        chain.append(block)
+    return chain
+
+
+def measure(function, *args):
+    """
+    Returns the result of function, the memory it keeps allocated, the number of memory blocks and the time
+    """
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    blocks = sys.getallocatedblocks() - blocks
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, blocks, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transactions", type=int, default=1000000)
+    parser.add_argument("--per-block", type=int, default=100)
+    parser.add_argument("--n", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'variant':>8} {'object':>12} {'bytes/obj':>10} {'allocs/obj':>11} {'us/obj':>8}")
+    for name, make_transactions, block_class in (("old", old_transactions, OldBlock), ("new", new_transactions, Block)):
+        random.seed(0)
+        transactions, memory, blocks, elapsed = measure(make_transactions, args.transactions, args.n)
+        count = len(transactions)
+        print(f"{name:>8} {'transaction':>12} {memory/count:>10.1f} {blocks/count:>11.2f} {1e6*elapsed/count:>8.2f}")
+
+        chain, memory, blocks, elapsed = measure(make_chain, block_class, transactions, args.per_block)
+        count = len(chain)
+        print(f"{name:>8} {'block':>12} {memory/count:>10.1f} {blocks/count:>11.2f} {1e6*elapsed/count:>8.2f}")
+        del transactions, chain
@@ -0,0 +1,61 @@
+"""
+Per-draw cost of the random variates used in the hot loops: the random module, scalar draws from a
+numpy generator, and rng.Stream which draws numpy blocks and hands them out one at a time
+
+With --run, also times a whole simulation (without writing the trees) with the arguments of run.py,
+by default the configuration of the README.
+
+python3 benchmarks/bench_rng.py --draws 1000000 --run
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import rng
+import run
+
+
+def per_draw(function, draws):
+    start = time.perf_counter()
+    for _ in range(draws):
+        function()
+    return (time.perf_counter() - start)*1e9/draws
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--draws", type=int, default=1000000)
+    parser.add_argument("--run", action="store_true", help="also time a whole simulation")
+    args, run_argv = parser.parse_known_args()
+
+    random.seed(0)
+    generator = np.random.default_rng(0)
+    stream = rng.Streams(0).stream(0, rng.TRANSACTIONS)
+    peers = list(range(100))
+
+    variants = [
+        ("expovariate", lambda: random.expovariate(0.5), lambda: generator.exponential(2.0), lambda: stream.expovariate(0.5)),
+        ("randint", lambda: random.randint(1, 5), lambda: generator.integers(1, 6), lambda: stream.randint(1, 5)),
+        ("choice", lambda: random.choice(peers), lambda: peers[generator.integers(len(peers))], lambda: stream.choice(peers)),
+    ]
+    print(f"{'draw':>12} {'random (ns)':>12} {'numpy (ns)':>11} {'stream (ns)':>12} {'speedup':>8}")
+    for name, python, numpy, streamed in variants:
+        python_ns = per_draw(python, args.draws)
+        numpy_ns = per_draw(numpy, args.draws)
+        stream_ns = per_draw(streamed, args.draws)
+        print(f"{name:>12} {python_ns:>12.1f} {numpy_ns:>11.1f} {stream_ns:>12.1f} {python_ns/stream_ns:>7.2f}x")
+
+    if args.run:
+        if not run_argv:
+            run_argv = ["--n", "10", "--z0", "0.9", "--z1", "0.1", "--Ttx", "1000000", "--I", "6000", "--time", "2880000"]
+        run_args = run.parse_args(run_argv + ["--seed", "0"])
+        random.seed(run_args.seed)
+        env, peers, network = run.build_simulation(run_args)
+        start = time.perf_counter()
+        env.run(until=run_args.time)
+        print(f"simulation {' '.join(run_argv)} : {time.perf_counter() - start:.2f} s")
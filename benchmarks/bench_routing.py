@@ -0,0 +1,63 @@
+"""
+Microbenchmark of the routing tables used by Peer.forward_transaction
+
+Forwards --forwards transactions from one peer to its --neighbors neighbors, checking and recording
+each id in the routing table the way forward_transaction does. The previous list-based table is
+timed on --list-forwards transactions only, since its cost grows quadratically.
+
+python3 benchmarks/bench_routing.py --forwards 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routing import RoutingTable
+
+
+def forward_list(forwards, neighbors):
+    # The previous representation: {neighbor: [list of TxIDs]}
+    table = {}
+    for id in range(forwards):
+        for n in neighbors:
+            if n in table.keys():
+                if id not in table[n]:
+                    table[n].append(id)
+            else:
+                table[n] = [id]
+    return sum(len(ids) for ids in table.values())
+
+
+def forward_table(forwards, neighbors, capacity):
+    table = RoutingTable(capacity)
+    for id in range(forwards):
+        for n in neighbors:
+            table.mark(n, id)
+    return table.size()
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    size = function(*args)
+    return time.perf_counter() - start, size
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Routing table microbenchmark")
+    parser.add_argument("--forwards", type=int, default=1000000, help="number of transactions forwarded")
+    parser.add_argument("--list-forwards", type=int, default=5000, help="number of transactions for the list-based table")
+    parser.add_argument("--neighbors", type=int, default=6, help="number of neighbors of the peer")
+    parser.add_argument("--capacity", type=int, default=10000, help="capacity of the LRU variant")
+    args = parser.parse_args()
+
+    neighbors = list(range(args.neighbors))
+    marks = args.forwards*args.neighbors
+
+    elapsed, size = timed(forward_list, args.list_forwards, neighbors)
+    print(f"list      : {args.list_forwards:>8} forwards in {elapsed:7.2f} s, {elapsed*1e9/(args.list_forwards*args.neighbors):8.1f} ns/mark, {size} ids kept")
+    elapsed, size = timed(forward_table, args.forwards, neighbors, None)
+    print(f"set       : {args.forwards:>8} forwards in {elapsed:7.2f} s, {elapsed*1e9/marks:8.1f} ns/mark, {size} ids kept")
+    elapsed, size = timed(forward_table, args.forwards, neighbors, args.capacity)
+    print(f"lru {args.capacity:<6}: {args.forwards:>8} forwards in {elapsed:7.2f} s, {elapsed*1e9/marks:8.1f} ns/mark, {size} ids kept")
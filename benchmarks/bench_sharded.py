@@ -0,0 +1,91 @@
+"""
+Speedup curve of the sharded heap engine
+
+Runs the same configuration and seed with the single process heap engine, then with --workers 1, 2,
+4, ... up to --max-workers, and reports the wall time, the speedup over the single process run and
+the messages between workers. The results of every sharded run (blocks mined and in the longest chain
+of every peer, events per type) must be the same as the single process ones, the script exits with
+an error if not. The speedup is bounded by the CPUs of the machine, which are printed too.
+
+python3 benchmarks/bench_sharded.py --n 10000 --Ttx 1000000 --I 600 --time 2000 --max-workers 16 --csv speedup.csv
+"""
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import run
+import sharded
+from block import validation_cache
+from transaction import tx_ids
+
+
+class Counter(logging.Handler):
+    """
+    Keeps the last line logged by sharded.run
+    """
+    def __init__(self):
+        super().__init__()
+        self.line = ""
+
+    def emit(self, record):
+        self.line = record.getMessage()
+
+
+def simulate(args):
+    random.seed(args.seed)
+    validation_cache.reset()
+    tx_ids.reset()
+    start = time.perf_counter()
+    if args.workers is None:
+        env, peers, network = run.build_simulation(args)
+        env.run(until=args.time)
+    else:
+        env, peers, network = sharded.run(args, run.build_simulation)
+    wall = time.perf_counter() - start
+    results = [(peer.num_gen, peer.count_longest(), peer.longest_chain.blkid) for peer in peers]
+    return wall, results, list(env.counts)
+
+
+if __name__ == "__main__":
+    parser_args = sys.argv[1:]
+    options = {"--max-workers": "16", "--csv": None}
+    for option in options:
+        if option in parser_args:
+            i = parser_args.index(option)
+            options[option] = parser_args[i + 1]
+            del parser_args[i:i + 2]
+    max_workers = int(options["--max-workers"])
+    if "--seed" not in parser_args:
+        parser_args += ["--seed", "1"]
+
+    counter = Counter()
+    sharded.logger.addHandler(counter)
+    sharded.logger.setLevel(logging.INFO)
+
+    print(f"CPUs: {os.cpu_count()}")
+    print(f"{'workers':>8} {'wall (s)':>9} {'speedup':>8}  details")
+    base_wall, base_results, base_counts = simulate(run.parse_args(parser_args + ["--engine", "heap"]))
+    print(f"{'-':>8} {base_wall:>9.2f} {1:>8.2f}  single process, events {sum(base_counts)}")
+    rows = [(0, base_wall, 1.0)]
+    workers = 1
+    mismatches = 0
+    while workers <= max_workers:
+        args = run.parse_args(parser_args + ["--engine", "heap", "--workers", str(workers)])
+        wall, results, counts = simulate(args)
+        same = results == base_results and counts == base_counts
+        mismatches += not same
+        print(f"{workers:>8} {wall:>9.2f} {base_wall/wall:>8.2f}  {'same results' if same else 'DIFFERENT RESULTS'}, {counter.line}")
+        rows.append((workers, wall, base_wall/wall))
+        workers *= 2
+
+    if options["--csv"] is not None:
+        with open(options["--csv"], "w") as f:
+            print("workers,wall,speedup", file=f)
+            for row in rows:
+                print(",".join(str(value) for value in row), file=f)
+    if mismatches:
+        sys.exit(1)
@@ -0,0 +1,33 @@
+"""
+Benchmark of the topology generation: build time of every kind of graph from 1k to 100k peers
+
+The time includes the CSR construction and the connectivity check and bridging.
+
+python3 benchmarks/bench_topology.py --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import topology
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Topology build benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="network sizes")
+    parser.add_argument("--degree", type=int, default=6, help="mean degree")
+    parser.add_argument("--kinds", nargs="+", default=topology.KINDS, help="kinds of graph")
+    args = parser.parse_args()
+
+    print(f"{'kind':>10} {'peers':>8} {'edges':>9} {'bridges':>8} {'build (s)':>10} {'us/peer':>8}")
+    for kind in args.kinds:
+        for n in args.sizes:
+            rng = np.random.default_rng(0)
+            start = time.perf_counter()
+            indptr, indices, bridges = topology.build(kind, n, args.degree, rng)
+            elapsed = time.perf_counter() - start
+            print(f"{kind:>10} {n:>8} {len(indices)//2:>9} {bridges:>8} {elapsed:>10.2f} {elapsed*1e6/n:>8.1f}")
@@ -0,0 +1,95 @@
+"""
+Export and load time of the trees of all the peers: one .tree text file per peer (Peer.save_tree,
+parsed back with treeio.read_text) against a single treeio binary file (treeio.export, treeio.load)
+
+--n peers all see a random tree of --blocks blocks, with their own arrival times. Loading includes
+reading every arrival time, the binary loader maps the file and sums the arrival matrix.
+
+python3 benchmarks/bench_treeio.py --n 1000 --blocks 2000
+"""
+import argparse
+import glob
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import treeio
+from block import Block
+from engine import Engine
+from peer import Peer
+from tree import BlockTree
+
+
+def make_peers(n, blocks):
+    env = Engine()
+    genesis = Block(None, 0, set([]), -1)
+    block_tree = BlockTree(genesis)
+    peers = [Peer(i, genesis, env, {"speed": "fast", "cpu": "high", "hashing power": 1/n}, block_tree) for i in range(n)]
+    tips = [genesis]
+    for height in range(1, blocks + 1):
+        # Mostly extend one of the last few blocks so the tree has some forks
+        parent = tips[max(0, len(tips) - 1 - int(random.expovariate(2)))]
+        block = Block(parent, float(height), set([]), random.randrange(n))
+        tips.append(block)
+        index = block_tree.add(block)
+        for peer in peers:
+            peer.arrivals[index] = block.timestamp + random.random()*100
+    for peer in peers:
+        peer.longest_chain = max(tips, key=lambda block: block.height)
+    return peers
+
+
+def export_text(peers, directory):
+    for peer in peers:
+        peer.save_tree(os.path.join(directory, f"tree_{peer.id}_{peer.longest_chain.height}.tree"))
+
+
+def load_text(directory):
+    total = 0.0
+    for filename in glob.glob(os.path.join(directory, "*.tree")):
+        _, blocks = treeio.read_text(filename)
+        total += sum(time for _, _, time in blocks)
+    return total
+
+
+def load_binary(filename):
+    columns = treeio.load(filename)
+    return float(np.nansum(columns["arrivals"]))
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=1000)
+    parser.add_argument("--blocks", type=int, default=2000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    peers = make_peers(args.n, args.blocks)
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, treeio.FILENAME)
+        text_export, _ = timed(export_text, peers, directory)
+        binary_export, _ = timed(treeio.export, peers, filename)
+        text_load, text_total = timed(load_text, directory)
+        binary_load, binary_total = timed(load_binary, filename)
+        assert abs(text_total - binary_total) <= 1e-6*abs(binary_total)
+
+        text_size = sum(os.path.getsize(f) for f in glob.glob(os.path.join(directory, "*.tree")))
+        print(f"{args.n} peers, {args.blocks + 1} blocks")
+        print(f"{'format':>8} {'export (s)':>11} {'load (s)':>9} {'size (MB)':>10}")
+        print(f"{'text':>8} {text_export:>11.2f} {text_load:>9.2f} {text_size/2**20:>10.1f}")
+        print(f"{'binary':>8} {binary_export:>11.2f} {binary_load:>9.2f} {os.path.getsize(filename)/2**20:>10.1f}")
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,61 @@
+"""
+Comparison of the transactions generated by every peer and replayed from a workload file
+
+Runs the same configuration and seed with a generator per peer, then with a workload file generated
+for it (outside the timed part, it is reused by any run with the same --n, --Ttx and --time), and
+reports the generation of the workload, the build and run wall times and the transactions generated.
+The blocks are mined with --I 1e12 by default so that the transactions dominate.
+
+python3 benchmarks/bench_workload.py --n 1000 --Ttx 100000 --time 20000
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import run
+import workload
+from block import validation_cache
+from transaction import tx_ids
+from engine import TX_GENERATION, TX_ARRIVAL
+
+
+def simulate(args):
+    random.seed(args.seed)
+    validation_cache.reset()
+    tx_ids.reset()
+    start = time.perf_counter()
+    env, peers, network = run.build_simulation(args)
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    env.run(until=args.time)
+    wall = time.perf_counter() - start
+    counts = network.scheduler.counts
+    return build, wall, counts[TX_GENERATION], counts[TX_ARRIVAL]
+
+
+if __name__ == "__main__":
+    parser_args = sys.argv[1:]
+    if "--seed" not in parser_args:
+        parser_args += ["--seed", "1"]
+    if "--I" not in parser_args:
+        parser_args += ["--I", "1e12"]
+    if "--z0" not in parser_args:
+        parser_args += ["--z0", "0.5", "--z1", "0.5"]
+    if "--engine" not in parser_args:
+        parser_args += ["--engine", "heap"]
+    args = run.parse_args(parser_args)
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "workload.bin")
+        start = time.perf_counter()
+        total = workload.generate(filename, args.n, args.Ttx, args.time, args.seed)
+        print(f"workload: {total} transactions generated in {time.perf_counter() - start:.3f} s, {os.path.getsize(filename)} bytes")
+
+        print(f"{'mode':>10} {'build (s)':>10} {'run (s)':>8} {'generated':>10} {'arrivals':>10}")
+        for mode, extra in (("generators", []), ("replay", ["--workload", filename])):
+            build, wall, generated, arrivals = simulate(run.parse_args(parser_args + extra))
+            print(f"{mode:>10} {build:>10.3f} {wall:>8.2f} {generated:>10} {arrivals:>10}")
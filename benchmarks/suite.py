@@ -0,0 +1,158 @@
+"""
+Benchmark suite of the simulator, with fixed seeds, compared against a stored baseline
+
+Every case runs in its own process so that its peak RSS is its own. Reported per case: wall time,
+events processed, events per wall second and peak RSS. The cases are:
+    build-n<n>            building the peers and the network (no event is processed)
+    gossip-n<n>           transaction gossip alone (no block is ever mined)
+    blocks-n<n>           block propagation alone (no transaction is ever generated)
+    readme-<engine>       the configuration of the README
+    scale-n<n>            scaling curve over the number of peers
+    scale-ttx<Ttx>        scaling curve over the transaction interarrival time
+
+The results are written as JSON. With --baseline, the events per second (wall time for the build
+cases) are compared to the baseline and the script exits with an error if a case is slower by more
+than --threshold.
+
+python3 benchmarks/suite.py --output results.json --baseline benchmarks/baseline.json
+python3 benchmarks/suite.py --output benchmarks/baseline.json   (store a new baseline)
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SEED = 1
+MIN_TIME = 1.0 # Short cases are repeated until they have run this long in total, the fastest run is kept
+
+README = ["--n", "10", "--z0", "0.9", "--z1", "0.1", "--Ttx", "1000000", "--I", "6000", "--time", "2880000"]
+
+# name -> (kind, arguments of run.py)
+CASES = {}
+for n in (100, 1000, 10000):
+    CASES[f"build-n{n}"] = ("build", ["--n", str(n), "--engine", "heap"])
+for n in (20, 100):
+    # Blocks take forever to mine
+    CASES[f"gossip-n{n}"] = ("run", ["--n", str(n), "--Ttx", str(n*10), "--I", "1e12", "--time", "20000", "--engine", "heap"])
+for n in (20, 100):
+    # Transactions take forever to be generated, every peer mines
+    CASES[f"blocks-n{n}"] = ("run", ["--n", str(n), "--Ttx", "1e12", "--I", "50", "--time", "20000", "--engine", "heap"])
+CASES["readme-simpy"] = ("run", README)
+CASES["readme-heap"] = ("run", README + ["--engine", "heap"])
+for n in (10, 50, 100, 200):
+    CASES[f"scale-n{n}"] = ("run", ["--n", str(n), "--Ttx", "1000", "--I", "600", "--time", "10000", "--engine", "heap"])
+for Ttx in (50, 200, 1000, 5000):
+    CASES[f"scale-ttx{Ttx}"] = ("run", ["--n", "50", "--Ttx", str(Ttx), "--I", "600", "--time", "10000", "--engine", "heap"])
+
+
+def time_case(kind, args):
+    """
+    Returns the wall time and the number of events of one run of a case
+    """
+    import run
+    from block import validation_cache
+    from transaction import tx_ids
+    # As in run.run_simulation, otherwise the repetitions find every block validated already
+    random.seed(SEED)
+    validation_cache.reset()
+    tx_ids.reset()
+    start = time.perf_counter()
+    env, peers, network = run.build_simulation(args)
+    events = 0
+    if kind == "run":
+        if args.engine == "heap" or args.broadcast == "fanout":
+            env.run(until=args.time)
+            events = sum(network.scheduler.counts)
+        else:
+            # simpy does not count its events
+            while env.peek() < args.time:
+                env.step()
+                events += 1
+    return time.perf_counter() - start, events
+
+
+def run_case(name):
+    """
+    Run one case in this process
+
+    returns: its results
+    """
+    import run
+    kind, argv = CASES[name]
+    args = run.parse_args(argv + ["--seed", str(SEED)])
+
+    walls = []
+    while sum(walls) < MIN_TIME:
+        wall, events = time_case(kind, args)
+        walls.append(wall)
+    wall = min(walls)
+
+    return {
+        "wall time (s)": wall,
+        "runs": len(walls),
+        "events": events,
+        "events per s": events/wall if events else None,
+        "peak RSS (MB)": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024, # KB on Linux
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Returns the cases slower than the baseline by more than threshold, as (name, baseline, result, change)
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result["events per s"] is not None and base["events per s"]:
+            change = result["events per s"]/base["events per s"] - 1 # Negative when slower
+        else:
+            change = base["wall time (s)"]/result["wall time (s)"] - 1
+        if change < -threshold:
+            regressions.append((name, base, result, change))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", nargs="+", default=None, help="prefixes of the cases to run (default: all)")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file of the results")
+    parser.add_argument("--baseline", default=None, help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="relative slowdown reported as a regression")
+    parser.add_argument("--run-case", default=None, help=argparse.SUPPRESS) # Used for the child processes
+    args = parser.parse_args()
+
+    if args.run_case is not None:
+        print(json.dumps(run_case(args.run_case)))
+        sys.exit(0)
+
+    names = [name for name in CASES if args.cases is None or any(name.startswith(prefix) for prefix in args.cases)]
+    results = {}
+    print(f"{'case':>16} {'wall (s)':>9} {'events':>9} {'events/s':>10} {'RSS (MB)':>9}")
+    for name in names:
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-case", name], check=True, capture_output=True, text=True).stdout
+        result = results[name] = json.loads(output.strip().splitlines()[-1])
+        events_per_s = f"{result['events per s']:.0f}" if result["events per s"] else "-"
+        print(f"{name:>16} {result['wall time (s)']:>9.2f} {result['events']:>9} {events_per_s:>10} {result['peak RSS (MB)']:>9.1f}")
+
+    with open(args.output, "w") as f:
+        json.dump({"python": platform.python_version(), "machine": platform.machine(), "seed": SEED, "cases": results}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["cases"]
+        regressions = compare(results, baseline, args.threshold)
+        for name, base, result, change in regressions:
+            print(f"Regression in {name} : {-100*change:.0f}% slower than the baseline")
+        if regressions:
+            sys.exit(1)
+        print(f"No regression above {100*args.threshold:.0f}% against {args.baseline}")
@@ -1,32 +1,150 @@
+from ledger import Ledger
+
+
+class TxIndex:
+    """
+    Index of the transactions included in a chain, shared by all the blocks along it.
+    A block that extends the tip of its parent's index reuses that index, a block that
+    forks off starts a new index on top of it, so nothing is copied.
+    """
+    MAX_DEPTH = 16 # Flatten the index once this many forks are stacked on top of each other
+
+    def __init__(self, base=None, base_height=-1):
+        """
+        base: index of the chain this one forks off (None for the genesis chain)
+        base_height: height of the fork point, entries of base above it belong to another branch
+        """
+        self.heights = {} # transaction id -> height of the block including it
+        self.base = base
+        self.base_height = base_height
+        self.tip = base_height
+        self.depth = 0 if base is None else base.depth + 1
+
+    def add(self, block):
+        """
+        Add the transactions of block, which must extend the tip of this index
+        """
+        for t in block.transactions:
+            self.heights[t.id] = block.height
+        self.tip = block.height
+
+    def height_of(self, txid, height):
+        """
+        Returns the height of the block including txid on the chain up to height, None if not included
+        """
+        index = self
+        while index is not None:
+            h = index.heights.get(txid)
+            if h is not None and h <= height:
+                return h
+            height = min(height, index.base_height)
+            index = index.base
+        return None
+
+    def flatten(self, height):
+        """
+        Returns a new index with no base, containing all the entries visible up to height
+        """
+        flat = TxIndex()
+        chain = []
+        index = self
+        while index is not None:
+            chain.append((index, height))
+            height = min(height, index.base_height)
+            index = index.base
+        for index, height in reversed(chain):
+            for txid, h in index.heights.items():
+                if h <= height:
+                    flat.heights[txid] = h
+        flat.tip = chain[0][1]
+        return flat
+
+
+class ValidationCache:
+    """
+    Verdicts of the blocks validated so far, keyed by blkid, along with the ledger of the valid ones.
+    The same block reaches every peer, so it only has to be validated once.
+    """
+    def __init__(self):
+        self.ledgers = {} # blkid -> ledger after the block, None if the block is invalid
+        self.calls = 0 # Number of calls to Block.validate
+        self.validations = 0 # Number of blocks actually validated
+
+    def reset(self):
+        """
+        Forget all the verdicts, before starting a new run in the same process
+        """
+        self.__init__()
+
+    def summary(self):
+        """
+        Returns a line with the number of validations per block
+        """
+        blocks = len(self.ledgers)
+        if blocks == 0:
+            return "Validations per block : no blocks validated"
+        return f"Validations per block : {self.validations/blocks:.2f} ({self.calls} validate calls, {self.validations} validations, {blocks} blocks)"
+
+
+validation_cache = ValidationCache() # Shared by all the peers of a run
+
+
+def transaction_id(transaction):
+    """
+    Sort key of the transactions of a block
+    """
+    return transaction.id
+
+
+def skip_height(height):
+    """
+    Returns the height of the ancestor the skip pointer of a block at height points to (as in Bitcoin Core),
+    following skip pointers from any block reaches any ancestor in O(log height) steps
+    """
+    if height < 2:
+        return 0
+    if height & 1:
+        # Clear the two lowest set bits of height - 1
+        below = (height - 1) & (height - 2)
+        return (below & (below - 1)) + 1
+    return height & (height - 1) # Clear the lowest set bit
+
+
 class Block:
     """
     A block is a collection of transactions that are validated together.
     """
+    __slots__ = ("prevblock", "timestamp", "transactions", "userid", "ledger", "height", "blkid", "tx_index", "size", "skip")
+
     def __init__(self, prevblock, timestamp, transactions, userid):
         """
         prevblock: the previous (parent) block in the chain (None if genesis block)
         timestamp: the time the block was created
         transactions: a set of transactions in the block
         userid: the id of the user who mined the block
-        balances: a dictionary of the balances of all users in the network
+        ledger: the balances of all users after this block, set by validate (given for the genesis block)
         """
         self.prevblock = prevblock
         self.timestamp = timestamp
         self.transactions = transactions
         self.userid = userid
 
-        trans_string = ""
-        for transaction in transactions:
-            trans_string += str(transaction) + " "
-        
+        # The id is hashed from integers only, the transactions as a frozenset of their ids so that
+        # the order of the set does not matter, which also keeps it the same across processes
         if prevblock == None:
-            self.balances = {}
+            self.ledger = Ledger()
             self.height = 0
-            self.blkid = hash(str(timestamp))
+            self.blkid = hash((timestamp,))
+            self.skip = None
         else:
-            self.balances = self.prevblock.balances.copy()
+            self.ledger = None
             self.height = self.prevblock.height + 1
-            self.blkid = hash(str(prevblock.blkid) + str(timestamp) + str(trans_string) + str(userid))
+            self.blkid = hash((prevblock.blkid, timestamp, frozenset([t.id for t in transactions]), userid))
+            # Ancestor at skip_height(height), the parent of the first blocks
+            self.skip = prevblock.ancestor_at(skip_height(self.height))
+
+        # Built lazily by get_tx_index, blocks that never become a longest chain never need it
+        self.tx_index = None
 
         # Size in Kb
         self.size = 8*(len(transactions) + 1) # Each transaction is 1 KB = 8 Kb, +1 due to coinbase transaction
@@ -34,32 +152,149 @@ class Block:
     def validate(self):
         """
         Validates the block by checking that the transactions are valid
+        The verdict is computed once per blkid and looked up in validation_cache afterwards
         """
-        balance_copy = self.balances.copy() #balance_copy shows cumulative balance after each transaction
-        for t in self.transactions:
+        validation_cache.calls += 1
+        if self.blkid in validation_cache.ledgers:
+            self.ledger = validation_cache.ledgers[self.blkid]
+            return self.ledger is not None
+
+        validation_cache.validations += 1
+        ledger = self.compute_ledger()
+        validation_cache.ledgers[self.blkid] = ledger
+        if ledger is None:
+            return False
+        self.ledger = ledger
+        return True
+
+    def compute_ledger(self):
+        """
+        Returns the ledger after this block, None if a transaction is invalid
+        Only the balance changes are stored, on top of the parent's ledger
+        """
+        parent_ledger = self.prevblock.ledger
+        deltas = {} # deltas shows the cumulative change after each transaction
+        # The verdict depends on the order of the transactions, take them by id so it is the same in every run
+        for t in sorted(self.transactions, key=transaction_id):
             if t.sender == t.receiver:
-                return False
+                return None
             if t.amount <= 0:
-                return False
-            if balance_copy[t.sender.id] < t.amount: # Check if the sender has enough coins
-                return False
-            balance_copy[t.sender.id] -= t.amount
-            balance_copy[t.receiver.id] += t.amount
-        self.balances = balance_copy
-
-        self.balances[self.userid] += 50 # Reward for mining the block
-        return True
+                return None
+            if parent_ledger.balance_of(t.sender) + deltas.get(t.sender, 0) < t.amount: # Check if the sender has enough coins
+                return None
+            deltas[t.sender] = deltas.get(t.sender, 0) - t.amount
+            deltas[t.receiver] = deltas.get(t.receiver, 0) + t.amount
+
+        deltas[self.userid] = deltas.get(self.userid, 0) + 50 # Reward for mining the block
+        return Ledger(parent_ledger, deltas)
+
+    def balance_of(self, id):
+        """
+        Returns the balance of user id after this block
+        """
+        return self.ledger.balance_of(id)
+
+    def get_tx_index(self):
+        """
+        Returns the index of the transactions included in the chain up to this block
+        """
+        if self.tx_index is not None:
+            return self.tx_index
+
+        # Walk back to the closest indexed ancestor, then index the blocks in chain order
+        pending = []
+        block = self
+        while block is not None and block.tx_index is None:
+            pending.append(block)
+            block = block.prevblock
+
+        for block in reversed(pending):
+            if block.prevblock is None:
+                block.tx_index = TxIndex()
+            else:
+                index = block.prevblock.tx_index
+                if index.tip != block.prevblock.height:
+                    # The parent already has an indexed child, fork off it
+                    index = TxIndex(index, block.prevblock.height)
+                    if index.depth > TxIndex.MAX_DEPTH:
+                        index = index.flatten(block.prevblock.height)
+                block.tx_index = index
+            block.tx_index.add(block)
+        return self.tx_index
+
+    def includes(self, transaction):
+        """
+        Returns True if the transaction is included in the chain up to this block
+        """
+        return self.get_tx_index().height_of(transaction.id, self.height) is not None
+
+    def ancestor_at(self, height):
+        """
+        Returns the ancestor of this block at height (the block itself at its own height), None if there is none
+        Costs O(log height) steps along the skip pointers
+        """
+        if height > self.height or height < 0:
+            return None
+        block = self
+        while block.height > height:
+            skip = skip_height(block.height)
+            skip_previous = skip_height(block.height - 1)
+            # Take the skip pointer unless the parent's one gets closer without overshooting
+            if block.skip is not None and (skip == height or (skip > height and not (skip_previous < skip - 2 and skip_previous >= height))):
+                block = block.skip
+            else:
+                block = block.prevblock
+        return block
+
+    def fork_point(self, other):
+        """
+        Returns the last block common to the chains of this block and other (their lowest common ancestor)
+        """
+        a = self.ancestor_at(other.height) if self.height > other.height else self
+        b = other.ancestor_at(self.height) if other.height > self.height else other
+        while a.blkid != b.blkid:
+            # At the same height both skip pointers go to the same height, jump if the common ancestor is still below
+            if a.skip is not None and a.skip.blkid != b.skip.blkid:
+                a = a.skip
+                b = b.skip
+            else:
+                a = a.prevblock
+                b = b.prevblock
+        return a
+
+    def reorg_path(self, tip):
+        """
+        Returns the blocks that leave and join the longest chain when its tip moves from this block to tip,
+        each list from its tip down to the fork point (excluded)
+        Costs the number of blocks between the tips and their fork point, plus O(log height)
+        """
+        fork = self.fork_point(tip)
+        left = []
+        block = self
+        while block.height > fork.height:
+            left.append(block)
+            block = block.prevblock
+        joined = []
+        block = tip
+        while block.height > fork.height:
+            joined.append(block)
+            block = block.prevblock
+        return left, joined
 
     def get_all_transactions(self):
         """
         Returns a set of all transactions in the chain up to this block
+        This walks the whole chain, use includes() for membership checks
         """
-        if self.prevblock == None:
-            return self.transactions
-        return self.transactions.union(self.prevblock.get_all_transactions())
+        transactions = set()
+        block = self
+        while block is not None:
+            transactions |= block.transactions
+            block = block.prevblock
+        return transactions
     
     def __str__(self):
         """
         Returns a string representation of the block
         """
-        return self.blkid
\ No newline at end of file
+        return str(self.blkid)
\ No newline at end of file
@@ -0,0 +1,118 @@
+import logging
+import os
+import pickle
+import random
+import threading
+import time
+import zlib
+from block import validation_cache
+from transaction import tx_ids
+from rng import streams
+from eventlog import event_trace
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def capture(env, peers, network):
+    """
+    Returns the whole state of a run of the heap engine: event queue, peers (with their mempools,
+    routing tables and arrivals), shared block tree, and the module-wide state (validation verdicts,
+    transaction ids, random streams, metrics, random module and event trace position)
+    """
+    return {
+        # Pickled first, parents before children, so that pickling a block finds its ancestors
+        # already memoized instead of recursing down the whole chain
+        "block tree": peers[0].block_tree,
+        "validation cache": validation_cache,
+        "time": env.now,
+        "env": env,
+        "peers": peers,
+        "network": network,
+        "tx ids": tx_ids,
+        "streams": streams,
+        "metrics": metrics,
+        "random": random.getstate(),
+        "trace": (event_trace.filename, event_trace.buffer_size, event_trace.tell()) if event_trace.enabled else None,
+    }
+
+
+def restore(state):
+    """
+    Put back the module-wide state of a captured run
+
+    returns: env, peers, network
+    """
+    # The modules hold references to these objects, so they are updated in place
+    validation_cache.__dict__.update(state["validation cache"].__dict__)
+    tx_ids.__dict__.update(state["tx ids"].__dict__)
+    streams.__dict__.update(state["streams"].__dict__)
+    metrics.__dict__.update(state["metrics"].__dict__)
+    random.setstate(state["random"])
+    if state["trace"] is not None:
+        filename, buffer_size, offset = state["trace"]
+        event_trace.open(filename, buffer_size, offset)
+    return state["env"], state["peers"], state["network"]
+
+
+def load(filename):
+    """
+    Read a checkpoint written by Checkpointer and restore it
+
+    returns: env, peers, network
+    """
+    with open(filename, "rb") as f:
+        state = pickle.loads(zlib.decompress(f.read()))
+    logger.info("Resuming from %s at time %s", filename, state["time"])
+    return restore(state)
+
+
+class Checkpointer:
+    """
+    Writes checkpoints of a run to a single file
+    The state is pickled while the simulation waits, then compressed and written by a background
+    thread (zlib releases the GIL) while the simulation goes on. The file is replaced atomically,
+    so a run killed while writing still has the previous checkpoint.
+    """
+    def __init__(self, filename, level=6):
+        """
+        filename: checkpoint file
+        level: zlib compression level
+        """
+        self.filename = filename
+        self.level = level
+        self.thread = None
+
+    def save(self, state):
+        """
+        Start writing a checkpoint of state, as returned by capture
+        """
+        self.wait()
+        start = time.perf_counter()
+        data = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        pause = time.perf_counter() - start
+        self.thread = threading.Thread(target=self.write, args=(data, state["time"], pause))
+        self.thread.start()
+
+    def write(self, data, now, pause):
+        start = time.perf_counter()
+        compressed = zlib.compress(data, self.level)
+        directory = os.path.dirname(self.filename)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        temporary = self.filename + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(compressed)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.filename)
+        logger.info("Checkpoint at time %s : %.2f MB (%.2f MB pickled), simulation paused %.3f s, written in %.3f s",
+                    now, len(compressed)/2**20, len(data)/2**20, pause, time.perf_counter() - start)
+
+    def wait(self):
+        """
+        Wait until the checkpoint being written, if any, is on disk
+        """
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
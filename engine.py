@@ -0,0 +1,158 @@
+import heapq
+
+# Event types
+TX_GENERATION = 0
+TX_ARRIVAL = 1
+BLOCK_ARRIVAL = 2
+MINING_COMPLETE = 3
+BLOCK_TRANSACTIONS = 4 # Missing transactions of a compact block fetched from its sender
+PROCESS_STEP = 5 # Step of a process of the serial mode: its start, the end of a timeout or of a process it waits for
+EVENT_NAMES = ["tx-generation", "tx-arrival", "block-arrival", "mining-complete", "block-transactions", "process-step"]
+
+# Subtracted from the seq of the start of a process, which comes before the other events of the same time as in simpy
+URGENT = 1 << 62
+
+
+class Event:
+    """
+    What a process of the serial mode waits for, the processes waiting on it resume when it happens
+    """
+    __slots__ = ("callbacks",)
+
+    def __init__(self):
+        self.callbacks = [] # None once the event has happened
+
+    def trigger(self):
+        callbacks = self.callbacks
+        self.callbacks = None
+        for callback in callbacks:
+            callback()
+
+
+class Process(Event):
+    """
+    A generator run by Engine, yielding the events it waits for, which is also the event of its end
+    """
+    __slots__ = ("engine", "generator")
+
+    def __init__(self, engine, generator):
+        super().__init__()
+        self.engine = engine
+        self.generator = generator
+
+    def resume(self):
+        while True:
+            try:
+                event = self.generator.send(None)
+            except StopIteration:
+                # The end of a process is an event of its own, as in simpy
+                self.engine.schedule(0, PROCESS_STEP, self.trigger, ())
+                return
+            if event.callbacks is not None:
+                event.callbacks.append(self.resume)
+                return
+            # The event has already happened, go on right away
+
+
+class Engine:
+    """
+    Lightweight discrete-event engine used instead of simpy
+    Events are (time, seq, kind, callback, payload) tuples in a binary heap, seq keeps the
+    events scheduled for the same time in FIFO order, like simpy does
+    The fan-out callbacks of Peer schedule plain events, the processes of the serial mode run on
+    timeout and process, which order their events as simpy does so that the runs are the same
+    """
+    def __init__(self):
+        self.now = 0
+        self.queue = []
+        self.seq = 0
+        self.counts = [0 for _ in EVENT_NAMES] # Number of events processed per type
+
+    def schedule(self, delay, kind, callback, payload):
+        """
+        Call callback(*payload) after delay
+
+        kind: type of the event, one of the constants above
+        """
+        self.seq += 1
+        heapq.heappush(self.queue, (self.now + delay, self.seq, kind, callback, payload))
+
+    def schedule_at(self, time, kind, callback, payload):
+        """
+        Call callback(*payload) at time, which must not be in the past
+        Used for the events computed by another engine, now + (time - now) is not always time in floating point
+        """
+        self.seq += 1
+        heapq.heappush(self.queue, (time, self.seq, kind, callback, payload))
+
+    def timeout(self, delay):
+        """
+        Returns an event that happens after delay, for the processes of the serial mode (as simpy's timeout)
+        """
+        event = Event()
+        self.schedule(delay, PROCESS_STEP, event.trigger, ())
+        return event
+
+    def process(self, generator):
+        """
+        Start a process of the serial mode, before the other events of the current time (as simpy's process)
+
+        returns: the process, an event that happens when it ends
+        """
+        process = Process(self, generator)
+        self.seq += 1
+        heapq.heappush(self.queue, (self.now, self.seq - URGENT, PROCESS_STEP, process.resume, ()))
+        return process
+
+    def run(self, until):
+        """
+        Process the events scheduled before time until
+        """
+        queue = self.queue
+        counts = self.counts
+        pop = heapq.heappop
+        while queue and queue[0][0] < until:
+            self.now, _, kind, callback, payload = pop(queue)
+            counts[kind] += 1
+            callback(*payload)
+        self.now = until
+
+    def summary(self):
+        """
+        Returns a line with the number of events processed per type
+        """
+        return "Events : " + ", ".join(f"{name} {count}" for name, count in zip(EVENT_NAMES, self.counts))
+
+
+class SimpyScheduler:
+    """
+    The scheduling interface of Engine on top of a simpy environment
+    Every event is a timeout with a callback, no process is created
+    """
+    def __init__(self, env):
+        """
+        env: simpy environment
+        """
+        self.env = env
+        self.counts = [0 for _ in EVENT_NAMES]
+
+    @property
+    def now(self):
+        return self.env.now
+
+    def schedule(self, delay, kind, callback, payload):
+        """
+        Call callback(*payload) after delay
+
+        kind: type of the event, one of the constants above
+        """
+        counts = self.counts
+
+        def fire(_):
+            counts[kind] += 1
+            callback(*payload)
+
+        self.env.timeout(delay).callbacks.append(fire)
+
+    def summary(self):
+        return Engine.summary(self)
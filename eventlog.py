@@ -0,0 +1,81 @@
+import json
+
+
+class EventTrace:
+    """
+    Buffered JSON-lines trace of the simulation events
+    Events are kept in memory as tuples and written in bulk every buffer_size events,
+    callers check enabled first so that a disabled trace costs a single attribute lookup
+    """
+    def __init__(self):
+        self.enabled = False
+        self.filename = None
+        self.file = None
+        self.buffer = []
+        self.buffer_size = 65536
+
+    def open(self, filename, buffer_size=65536, offset=None):
+        """
+        Start tracing to filename
+
+        buffer_size: number of events kept in memory before a write
+        offset: continue an existing trace from this position (as returned by tell), dropping what follows it
+        """
+        if offset is None:
+            self.file = open(filename, "w")
+        else:
+            self.file = open(filename, "r+")
+            self.file.truncate(offset)
+            self.file.seek(offset)
+        self.filename = filename
+        self.buffer = []
+        self.buffer_size = buffer_size
+        self.enabled = True
+
+    def record(self, time, event, peer, id, **fields):
+        """
+        Record an event
+
+        time: simulation time of the event
+        event: name of the event
+        peer: id of the peer where it happened
+        id: id of the transaction or block concerned
+        fields: extra fields of the event
+        """
+        self.buffer.append((time, event, peer, id, fields))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered events
+        """
+        lines = []
+        for time, event, peer, id, fields in self.buffer:
+            entry = {"time": time, "event": event, "peer": peer, "id": id}
+            entry.update(fields)
+            lines.append(json.dumps(entry))
+        if lines:
+            self.file.write("\n".join(lines) + "\n")
+        self.buffer = []
+
+    def tell(self):
+        """
+        Flush the buffered events and returns the position in the file, to continue the trace from there later
+        """
+        self.flush()
+        self.file.flush()
+        return self.file.tell()
+
+    def close(self):
+        """
+        Flush the remaining events and stop tracing
+        """
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+        self.file = None
+        self.enabled = False
+
+
+event_trace = EventTrace() # Shared by all the peers of a run
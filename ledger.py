@@ -0,0 +1,68 @@
+MAX_DISTANCE = 32 # Never walk back more than this many blocks to find a balance
+
+
+class Ledger:
+    """
+    The balances of all users after a block, stored as the changes caused by that block
+    on top of the parent's ledger. A full snapshot is taken once the changes stored since the
+    last one add up to as many entries as a snapshot has, so snapshots never cost more memory
+    than the changes themselves (or after MAX_DISTANCE blocks, to bound the lookup time).
+    """
+    def __init__(self, parent=None, deltas=None):
+        """
+        parent: ledger of the previous block (None for the genesis block)
+        deltas: dictionary of balance changes caused by the block, {user id: change}
+        For the genesis block deltas are the initial balances
+        """
+        self.parent = parent
+        self.deltas = deltas if deltas is not None else {}
+
+        if parent is None:
+            self.take_snapshot({})
+        else:
+            # Number of blocks and of stored changes since the last snapshot
+            self.distance = parent.distance + 1
+            self.pending = parent.pending + len(self.deltas)
+            self.snapshot_size = parent.snapshot_size
+            if self.pending >= self.snapshot_size or self.distance >= MAX_DISTANCE:
+                self.take_snapshot(parent.balances())
+            else:
+                self.snapshot = None
+
+    def take_snapshot(self, balances):
+        """
+        Store the full balances after this block, balances are the ones before it
+        """
+        for id, change in self.deltas.items():
+            balances[id] = balances.get(id, 0) + change
+        self.snapshot = balances
+        self.snapshot_size = len(balances)
+        self.distance = 0
+        self.pending = 0
+
+    def balance_of(self, id):
+        """
+        Returns the balance of user id
+        """
+        total = 0
+        ledger = self
+        while ledger.snapshot is None:
+            total += ledger.deltas.get(id, 0)
+            ledger = ledger.parent
+        return total + ledger.snapshot.get(id, 0)
+
+    def balances(self):
+        """
+        Returns a new dictionary with the balances of all users
+        """
+        chain = []
+        ledger = self
+        while ledger.snapshot is None:
+            chain.append(ledger)
+            ledger = ledger.parent
+
+        balances = dict(ledger.snapshot)
+        for ledger in reversed(chain):
+            for id, change in ledger.deltas.items():
+                balances[id] = balances.get(id, 0) + change
+        return balances
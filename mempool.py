@@ -0,0 +1,87 @@
+import random
+from collections import OrderedDict
+from block import transaction_id
+
+
+class Mempool:
+    """
+    Pending transactions of a peer, the ones it has received that are not included in its longest chain.
+    Transactions are indexed by arrival order (for eviction) and kept in a list with the
+    position of each one (for sampling and removal in constant time).
+    """
+    def __init__(self, capacity=None):
+        """
+        capacity: maximum number of pending transactions, the oldest ones are evicted beyond it (None for no limit)
+        """
+        self.capacity = capacity
+        # A dict would do as a FIFO, but popping its first key walks over the slots left by the removed
+        # ones, so eviction would get slower as the capacity grows
+        self.arrivals = OrderedDict() # tx id -> transaction, in arrival order
+        self.items = [] # pending transactions in no particular order
+        self.positions = {} # tx id -> position in items
+        self.evicted = 0 # Number of transactions evicted so far
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, txid):
+        return txid in self.positions
+
+    def add(self, transaction):
+        """
+        Add a pending transaction, evicting the oldest one if the mempool is full
+
+        returns: True if the transaction was not already pending
+        """
+        if transaction.id in self.positions:
+            return False
+        if self.capacity is not None and len(self.items) >= self.capacity:
+            if self.capacity <= 0:
+                self.evicted += 1
+                return False
+            txid, _ = self.arrivals.popitem(last=False)
+            self.discard(txid)
+            self.evicted += 1
+
+        self.arrivals[transaction.id] = transaction
+        self.positions[transaction.id] = len(self.items)
+        self.items.append(transaction)
+        return True
+
+    def discard(self, txid):
+        """
+        Remove a transaction if it is pending
+        """
+        position = self.positions.pop(txid, None)
+        if position is None:
+            return
+        transaction = self.items[position]
+        self.arrivals.pop(txid, None) # Already popped when evicted
+
+        # Move the last transaction into the hole
+        last = self.items.pop()
+        if last is not transaction:
+            self.items[position] = last
+            self.positions[last.id] = position
+
+    def sample(self, count, rng=random):
+        """
+        Returns count pending transactions picked at random, in time proportional to count
+
+        rng: the random module or a rng.Stream
+        """
+        return rng.sample(self.items, count)
+
+    def reorg(self, left, joined):
+        """
+        Follow a change of the longest chain, as returned by Block.reorg_path: the transactions of the
+        blocks that left the chain are pending again, the ones of the blocks that joined it are confirmed
+        """
+        # Oldest blocks first, so the transactions keep roughly their arrival order
+        # and by id within a block, the order of the items decides what sample returns
+        for block in reversed(left):
+            for t in sorted(block.transactions, key=transaction_id):
+                self.add(t)
+        for block in joined:
+            for t in block.transactions:
+                self.discard(t.id)
@@ -0,0 +1,228 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class P2Quantile:
+    """
+    Streaming estimate of a quantile with the P-square algorithm (Jain and Chlamtac, 1985)
+    Keeps five markers whatever the number of observations
+    """
+    def __init__(self, p):
+        """
+        p: quantile to estimate, in (0, 1)
+        """
+        self.p = p
+        self.count = 0
+        self.heights = [] # Marker heights, the first five observations until there are five
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0, 2*p, 4*p, 2 + 2*p, 4]
+        self.increments = [0, p/2, p, (1 + p)/2, 1]
+
+    def add(self, x):
+        """
+        Add an observation
+        """
+        self.count += 1
+        q = self.heights
+        if self.count <= 5:
+            q.append(x)
+            q.sort()
+            return
+
+        # Cell k of the observation, the extreme markers follow the minimum and maximum
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+
+        n = self.positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Move the middle markers towards their desired positions
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                parabolic = q[i] + d/(n[i + 1] - n[i - 1])*((n[i] - n[i - 1] + d)*(q[i + 1] - q[i])/(n[i + 1] - n[i])
+                                                           + (n[i + 1] - n[i] - d)*(q[i] - q[i - 1])/(n[i] - n[i - 1]))
+                if q[i - 1] < parabolic < q[i + 1]:
+                    q[i] = parabolic
+                else:
+                    q[i] = q[i] + d*(q[i + d] - q[i])/(n[i + d] - n[i])
+                n[i] += d
+
+    def value(self):
+        """
+        Returns the estimated quantile, None before the first observation
+        """
+        if self.count == 0:
+            return None
+        if self.count <= 5:
+            return self.heights[min(int(self.p*self.count), self.count - 1)]
+        return self.heights[2]
+
+
+class Metrics:
+    """
+    Results of a run updated as the events happen, with periodic snapshots
+    The longest chain is the one of the whole block tree (highest, then earliest block), the one the peers
+    converge to. Propagation delays are the times from the end of the proof of work of a block to its
+    first arrival at every other peer. Callers check enabled first, like for the event trace.
+    """
+    QUANTILES = [0.5, 0.9, 0.99]
+
+    def __init__(self):
+        self.enabled = False
+        self.filename = None
+        self.file = None
+
+    def start(self, peers, filename=None, offset=None):
+        """
+        Start collecting the metrics of a run
+
+        peers: all the peers of the run
+        filename: also write the snapshots to this file as JSON lines
+        offset: continue an existing file from this position, dropping what follows it
+        """
+        n = len(peers)
+        self.n = n
+        self.tip = peers[0].genesis
+        self.mined = [0]*n # Blocks mined per peer
+        self.accepted = [0]*n # Blocks of other peers accepted per peer
+        self.longest = [0]*n # Blocks mined per peer in the longest chain
+        self.blocks = 0 # Blocks mined
+        self.forks = 0 # Blocks mined on a parent that already had a child
+        self.reorgs = 0 # Changes of the longest chain to another branch
+        self.delays = [P2Quantile(p) for p in self.QUANTILES]
+        self.delay_count = 0
+        self.delay_total = 0.0
+        self.propagating = {} # blkid -> [time it was mined, number of peers yet to receive it]
+        self.snapshots = 0
+        self.enabled = True
+        if filename is not None:
+            self.open(filename, offset)
+
+    def open(self, filename, offset=None):
+        if offset is None:
+            self.file = open(filename, "w")
+        else:
+            self.file = open(filename, "r+")
+            self.file.truncate(offset)
+            self.file.seek(offset)
+        self.filename = filename
+
+    def __getstate__(self):
+        # Checkpoints keep the position in the snapshot file instead of the file
+        state = self.__dict__.copy()
+        state["file"] = None
+        state["offset"] = None
+        if self.file is not None:
+            self.file.flush()
+            state["offset"] = self.file.tell()
+        return state
+
+    def __setstate__(self, state):
+        offset = state.pop("offset")
+        self.__dict__.update(state)
+        if self.filename is not None and offset is not None:
+            self.open(self.filename, offset)
+
+    def block_mined(self, peer, block):
+        """
+        Called when peer adds a block it mined to its tree
+        """
+        self.mined[peer.id] += 1
+        self.blocks += 1
+        if len(peer.block_tree.children[peer.block_tree.index[block.prevblock.blkid]]) > 1:
+            self.forks += 1
+        self.propagating[block.blkid] = [peer.env.now, self.n - 1]
+
+        if block.height > self.tip.height or (block.height == self.tip.height and block.timestamp < self.tip.timestamp):
+            self.move_tip(block)
+
+    def move_tip(self, tip):
+        """
+        Make tip the end of the longest chain, updating the blocks of every peer that are in it
+        """
+        left, joined = self.tip.reorg_path(tip)
+        if left:
+            self.reorgs += 1
+        for block in left:
+            self.longest[block.userid] -= 1
+        for block in joined:
+            self.longest[block.userid] += 1
+        self.tip = tip
+
+    def block_received(self, peer, block):
+        """
+        Called when a valid block first reaches peer
+        """
+        self.accepted[peer.id] += 1
+        propagating = self.propagating.get(block.blkid)
+        if propagating is None:
+            return
+        delay = peer.env.now - propagating[0]
+        for quantile in self.delays:
+            quantile.add(delay)
+        self.delay_count += 1
+        self.delay_total += delay
+        propagating[1] -= 1
+        if propagating[1] == 0:
+            del self.propagating[block.blkid]
+
+    def snapshot(self, now, peers):
+        """
+        Log the current metrics and write them to the snapshot file
+
+        returns: the snapshot
+        """
+        sizes = [len(peer.mempool) for peer in peers]
+        snapshot = {
+            "time": now,
+            "blocks": self.blocks,
+            "height": self.tip.height,
+            "orphans": self.blocks - self.tip.height,
+            "fork rate": self.forks/self.blocks if self.blocks else 0.0,
+            "reorgs": self.reorgs,
+            "delay mean": self.delay_total/self.delay_count if self.delay_count else None,
+        }
+        for p, quantile in zip(self.QUANTILES, self.delays):
+            snapshot[f"delay p{round(100*p)}"] = quantile.value()
+        snapshot["mempool mean"] = sum(sizes)/len(sizes)
+        snapshot["mempool max"] = max(sizes)
+        snapshot["mined"] = list(self.mined)
+        snapshot["accepted"] = list(self.accepted)
+        snapshot["longest"] = list(self.longest)
+        self.snapshots += 1
+
+        delays = " ".join(f"p{round(100*p)} {quantile.value():.1f}" for p, quantile in zip(self.QUANTILES, self.delays) if quantile.count)
+        logger.info("Time %s : height %s, %s blocks, %s orphans, fork rate %.3f, delays (ms) %s, mempool mean %.1f max %s",
+                    now, snapshot["height"], self.blocks, snapshot["orphans"], snapshot["fork rate"], delays or "-",
+                    snapshot["mempool mean"], snapshot["mempool max"])
+        if self.file is not None:
+            self.file.write(json.dumps(snapshot) + "\n")
+            self.file.flush()
+        return snapshot
+
+    def close(self):
+        """
+        Stop collecting
+        """
+        if self.file is not None:
+            self.file.close()
+        self.file = None
+        self.enabled = False
+
+
+metrics = Metrics() # Shared by all the peers of a run
@@ -1,119 +1,141 @@
+import heapq
+import logging
 import random 
+from array import array
+from collections import OrderedDict
+import numpy as np
+import topology
+from engine import Engine, SimpyScheduler, TX_ARRIVAL, BLOCK_ARRIVAL, BLOCK_TRANSACTIONS
+from rng import streams, LATENCY
+
+logger = logging.getLogger(__name__)
+
+# Message sizes of the compact block relay in Kb (BIP 152)
+HEADER_SIZE = 8 # Header and coinbase transaction, sent in full
+SHORT_ID_SIZE = 0.048 # 6 bytes per transaction of the block
+BLOCK_HASH_SIZE = 0.256 # 32 bytes, names the block in the requests and responses of missing transactions
 
 class Network:
     """
     Network class that contains that handles the propagtions of transactions and blocks
     """
-    def __init__(self, peers, interarrival, env) -> None:
+    def __init__(self, peers, interarrival, env, broadcast="serial", topology="random", degree=6, relay="full",
+                 tx_gossip="flood", flood_cache=None) -> None:
         """
         peers: list of peers in the network
         interarrival: interarrival time of transactions
-        env: simpy environment
+        env: simpy environment or Engine
+        broadcast: "serial" to send to one neighbor after the other through nested processes,
+                   "fanout" to schedule the deliveries to all neighbors at once as plain timed events
+        topology: kind of random graph, one of topology.KINDS
+        degree: mean degree of the graph (not used by the default "random" topology)
+        relay: "full" to send whole blocks, "compact" to send the header and short ids of the transactions,
+               the receiver rebuilds the block from its mempool and fetches the missing transactions
+        tx_gossip: "flood" to relay transactions hop by hop, "analytic" to compute their arrival time at every
+                   peer from the fastest paths of the origin and only schedule the arrivals
+        flood_cache: maximum number of origins whose fastest paths are kept (None for no limit)
         """
         self.peers = peers
         self.peer_ids = []
         self.interarrival = interarrival
+        self.broadcast = broadcast
+        self.topology = topology
+        self.degree = degree
+        self.relay = relay
+        self.block_kb = 0.0 # Kb sent to relay blocks, including the round trips of compact blocks
+        self.round_trips = 0 # Compact blocks that needed missing transactions
+        self.fetched = 0 # Missing transactions fetched
+        self.tx_gossip = tx_gossip
+        self.flood_cache = OrderedDict() # origin id -> (delays, predecessors) of its fastest paths
+        self.flood_capacity = flood_cache
+        self.flood_adjacency = None # Built on the first analytic transaction
+        self.replay = None # workload.Replay driving the transactions, if they come from a workload file
 
         for i in range(len(self.peers)):
             self.peer_ids.append(self.peers[i].id)
+        # Queueing delays are drawn from the stream of the sender
+        self.latency_random = {peer.id: streams.stream(peer.id, LATENCY) for peer in peers}
 
         self.generate_network()
         self.check_graph()
         self.init_properties()
 
         self.env = env
+        self.scheduler = env if isinstance(env, Engine) else SimpyScheduler(env)
 
     def generate_network(self):
         """
-        Generate a random network with 4 neighbors for each peer 
-        Fully connected graph
+        Generate a random topology of kind self.topology, stored as CSR adjacency
+        The neighbors of peer i are self.indices[self.indptr[i]:self.indptr[i+1]]
         """
-        for peer in self.peers:
-            num_neighbors = random.randint(4, 8)
-            num_neighbors = min(num_neighbors, len(self.peers))
-
-            temp_list = list(set(self.peers.copy()) - set([peer]))
-            neighbors = random.sample(temp_list, num_neighbors)
-
-            for n in neighbors:
-                peer.add_neighbor(n)
-                n.add_neighbor(peer)
+        self.rng = np.random.default_rng(random.getrandbits(64))
+        u, v = topology.generate(self.topology, len(self.peers), self.degree, self.rng)
+        self.indptr, self.indices = topology.to_csr(len(self.peers), u, v)
 
     def check_graph(self):
-        # check if the graph is connected
-        # if not, connect the graph
-        
-        visited = [False for i in range(len(self.peers))]
-
-        def dfs(node):
-            visited[node.id] = True
-            for n in node.neighbors:
-                if not visited[n.id]:
-                    dfs(n)
-        dfs(self.peers[0])
-        connected = True
-
-        for i in range(len(visited)):
-            if not visited[i]:
-                connected = False
-
-        print("connected: ", connected)
-
-        if not connected:
-            # connect the graph
-            num_peers = len(self.peers)
-            for i in range(num_peers):
-                peer = self.peers[i]
-                peer.disconnect_peer()
-
-                for j in range(4):
-                    peer.add_neighbor(self.peers[(i+j-2)%num_peers])
-                    peer.add_neighbor(self.peers[(i+j-1)%num_peers])
-                    peer.add_neighbor(self.peers[(i+j+1)%num_peers])
-                    peer.add_neighbor(self.peers[(i+j+2)%num_peers])
-                    
+        """
+        Check if the graph is connected (union-find), if not connect it with the fewest bridging edges
+        Then set the neighbors of every peer
+        """
+        self.indptr, self.indices, bridges = topology.bridge(len(self.peers), self.indptr, self.indices, self.rng)
+        logger.info("connected: %s", bridges == 0)
+        if bridges > 0:
+            logger.info("bridging edges added: %s", bridges)
+
+        indptr = self.indptr.tolist()
+        indices = self.indices.tolist()
+        for i, peer in enumerate(self.peers):
+            peer.disconnect_peer()
+            for j in indices[indptr[i]:indptr[i+1]]:
+                peer.add_neighbor(self.peers[j])
 
     def init_properties(self):
         """
-        Init the propagation delay, computation delay, and queueing delay for each peer pair
+        Init the propagation delay and link speed of each edge of the network
+        Properties are stored only for the edges, in arrays indexed by edge id
+        The queueing delay is drawn on every message from an exponential distribution with mean 96/c
         """
-        self.p = [[0 for i in range(len(self.peers))] for j in range(len(self.peers))]
-        self.c = [[0 for i in range(len(self.peers))] for j in range(len(self.peers))]
-        self.d = [[None for i in range(len(self.peers))] for j in range(len(self.peers))]
+        self.edge_index = [{} for i in range(len(self.peers))] # edge_index[i][j] is the id of the edge between peers i and j
+        self.p = array("d") # propagation delay in ms
+        self.c = array("d") # link speed in Mbps
 
-        for i in range(len(self.peers)):
-            for j in range(len(self.peers)):
-                if i == j:
-                    self.p[i][j] = 0
-                    self.c[i][j] = 0
-                    self.d[i][j] = None
+        for peer in self.peers:
+            i = peer.id
+            for n in peer.neighbors:
+                j = n.id
+                if j in self.edge_index[i]:
+                    continue
+                edge = len(self.p)
+                self.edge_index[i][j] = edge
+                self.edge_index[j][i] = edge
+
+                # Init the propagation delay
+                # In ms
+                self.p.append(random.randint(10, 500))
+
+                # Init the link speed
+                # In Mbps
+                if peer.speed == 'fast' and n.speed == 'fast':
+                    self.c.append(100)
                 else:
-                    # Init the propagation delay
-                    val = self.p[j][i]
-                    
-                    # In ms
-                    if val != 0:
-                        self.p[i][j] = val
-                    else:
-                        r = random.randint(10, 500)
-                        self.p[i][j] = r
-
-                    # Init the computation delay
-                    speed_i = self.peers[i].speed
-                    speed_j = self.peers[j].speed
-
-                    # In Mbps
-                    if speed_i == 'fast' and speed_j == 'fast':
-                        self.c[i][j] = 100
-                    else:
-                        self.c[i][j] = 5
-
-                    # Init the queueing delay
-                    # In ms
-                    if self.d[j][i] is not None:
-                        self.d[i][j] = self.d[j][i]
-                    else:
-                        self.d[i][j] = random.expovariate
+                    self.c.append(5)
+
+    def latency(self, sender, receiver, size):
+        """
+        Returns the latency of a message of size Kb from sender to receiver
+        Propagation delay + transmission delay + queueing delay
+        """
+        edge = self.edge_index[sender.id][receiver.id]
+        c = self.c[edge]
+        return self.p[edge] + size/c + self.latency_random[sender.id].expovariate(c/96)
+
+    def schedule(self, delay, kind, callback, *args):
+        """
+        Call callback(*args) after delay as a plain timed event, without creating a process
+
+        kind: type of the event, one of the constants of engine
+        """
+        self.scheduler.schedule(delay, kind, callback, args)
 
     def send_transaction(self, sender, receiver, transaction):
         """
@@ -121,17 +143,125 @@ class Network:
         """
         # print("Send transaction from", sender.id, "to", receiver.id)
         # Each transaction is 1KB = 8Kb
-        latency = self.p[sender.id][receiver.id] + 8/self.c[sender.id][receiver.id] + self.d[sender.id][receiver.id](self.c[sender.id][receiver.id]/96)
+        latency = self.latency(sender, receiver, 8)
         # print("Latency:", latency)
 
         yield self.env.timeout(latency)
         yield self.env.process(receiver.receive_transaction(sender, transaction))
 
+    def deliver_transaction(self, sender, receiver, transaction):
+        """
+        Fan-out counterpart of send_transaction, schedules the arrival of the transaction at receiver
+        """
+        self.schedule(self.latency(sender, receiver, 8), TX_ARRIVAL, receiver.on_transaction, sender, transaction)
+
+    def block_latency(self, sender, receiver, block):
+        """
+        Returns the latency of block from sender to receiver, of its header and short ids only with the compact relay
+        """
+        if self.relay == "compact":
+            size = HEADER_SIZE + SHORT_ID_SIZE*len(block.transactions)
+        else:
+            size = block.size
+        self.block_kb += size
+        return self.latency(sender, receiver, size)
+
+    def fetch_latency(self, sender, receiver, missing):
+        """
+        Returns the time receiver takes to fetch the missing transactions of a compact block from sender
+        The request names them by short id, the response carries them in full
+        """
+        request = BLOCK_HASH_SIZE + SHORT_ID_SIZE*missing
+        response = BLOCK_HASH_SIZE + 8*missing
+        self.block_kb += request + response
+        self.round_trips += 1
+        self.fetched += missing
+        return self.latency(receiver, sender, request) + self.latency(sender, receiver, response)
+
+    def flood_paths(self, origin):
+        """
+        Returns the delays and predecessors of the fastest paths from peer origin to every peer (Dijkstra),
+        the queueing delay of a link is its mean 96/c, so the paths of an origin are computed once
+        """
+        paths = self.flood_cache.get(origin)
+        if paths is not None:
+            self.flood_cache.move_to_end(origin)
+            return paths
+
+        if self.flood_adjacency is None:
+            # Latency of a transaction on every link: propagation + transmission of 8 Kb + mean queueing
+            self.flood_adjacency = [[(j, self.p[edge] + (8 + 96)/self.c[edge]) for j, edge in edges.items()]
+                                    for edges in self.edge_index]
+        adjacency = self.flood_adjacency
+        delays = [float("inf")]*len(self.peers)
+        predecessors = [-1]*len(self.peers)
+        delays[origin] = 0.0
+        queue = [(0.0, origin)]
+        while queue:
+            delay, i = heapq.heappop(queue)
+            if delay > delays[i]:
+                continue
+            for j, latency in adjacency[i]:
+                if delay + latency < delays[j]:
+                    delays[j] = delay + latency
+                    predecessors[j] = i
+                    heapq.heappush(queue, (delay + latency, j))
+
+        paths = (array("d", delays), array("l", predecessors))
+        self.flood_cache[origin] = paths
+        if self.flood_capacity is not None and len(self.flood_cache) > self.flood_capacity:
+            self.flood_cache.popitem(last=False)
+        return paths
+
+    def flood_transaction(self, origin, transaction):
+        """
+        Analytic counterpart of the gossip of a transaction generated by origin, schedules its arrival at
+        every other peer at the end of the fastest path, from the last peer on that path
+        """
+        delays, predecessors = self.flood_paths(origin.id)
+        peers = self.peers
+        for i, delay in enumerate(delays):
+            if i != origin.id:
+                self.schedule(delay, TX_ARRIVAL, peers[i].on_flooded_transaction, peers[predecessors[i]], transaction)
+
+    def deliver_block(self, sender, receiver, block):
+        """
+        Fan-out counterpart of send_block, schedules the arrival of the block at receiver
+        """
+        if self.relay == "compact":
+            self.schedule(self.block_latency(sender, receiver, block), BLOCK_ARRIVAL, self.reconstruct_block, sender, receiver, block)
+        else:
+            self.schedule(self.block_latency(sender, receiver, block), BLOCK_ARRIVAL, receiver.on_block, sender, block)
+
+    def reconstruct_block(self, sender, receiver, block):
+        """
+        Called when a compact block arrives at receiver, which gets the block at once if it has all the
+        transactions, otherwise once the missing ones are fetched from sender
+        """
+        missing = receiver.missing_transactions(block)
+        if missing == 0:
+            receiver.on_block(sender, block)
+        else:
+            self.schedule(self.fetch_latency(sender, receiver, missing), BLOCK_TRANSACTIONS, receiver.on_block, sender, block)
+
     def send_block(self, sender, receiver, block):
         """
         Send and recieve a block from sender to receiver with latency
         """
-        latency = self.p[sender.id][receiver.id] + block.size/self.c[sender.id][receiver.id] + self.d[sender.id][receiver.id](self.c[sender.id][receiver.id]/96)
+        latency = self.block_latency(sender, receiver, block)
         yield self.env.timeout(latency)
+        if self.relay == "compact":
+            missing = receiver.missing_transactions(block)
+            if missing:
+                yield self.env.timeout(self.fetch_latency(sender, receiver, missing))
         yield self.env.process(receiver.receive_block(sender,block))
-        print("Block received by", receiver.id)
\ No newline at end of file
+        logger.debug("Block received by %s", receiver.id)
+
+    def relay_summary(self):
+        """
+        Returns a line with the amount of data sent to relay blocks
+        """
+        line = f"Block relay : {self.relay}, {self.block_kb/1000:.1f} Mb sent"
+        if self.relay == "compact":
+            line += f", {self.round_trips} round trips fetching {self.fetched} missing transactions"
+        return line
\ No newline at end of file
@@ -1,20 +1,31 @@
-import random 
-from transaction import Transaction
-from block import Block
-from tree import Node
-import graphviz
+from transaction import Transaction, tx_ids
+from block import Block, transaction_id
+from tree import BlockTree
+from routing import RoutingTable
+from mempool import Mempool
+from engine import TX_GENERATION, MINING_COMPLETE
+from eventlog import event_trace
+from metrics import metrics
+from rng import streams, TRANSACTIONS, MINING
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 class Peer:
     """
     A peer(node) in the network
     """
-    def __init__(self, id, genesis, env, config) -> None:      
+    def __init__(self, id, genesis, env, config, block_tree=None) -> None:      
         """
         id: unique id of the peer
         genesis: genesis block
-        env: simpy environment
+        env: simpy environment or Engine
         config: dictionary containing the configuration of the peer
+            optional "routing capacity": maximum number of ids kept per neighbor in the routing tables
+            optional "routing bury depth": forget the ids of transactions and blocks buried this many blocks deep
+            optional "mempool capacity": maximum number of pending transactions
+        block_tree: BlockTree shared by all the peers (a new one if None)
         """
         self.id = id
         self.neighbors = []
@@ -23,17 +34,22 @@ class Peer:
         self.cpu = config["cpu"]   # low or high
         self.balance = 0 
         self.longest_chain = genesis
-        self.transactions = set([])
+        self.mempool = Mempool(config.get("mempool capacity"))
         self.num_gen = 0
 
-        self.transaction_routing_table = {}
-        self.block_routing_table = {}
+        self.transaction_routing_table = RoutingTable(config.get("routing capacity"))
+        self.block_routing_table = RoutingTable(config.get("routing capacity"))
+        self.bury_depth = config.get("routing bury depth")
+        self.buried_height = 0 # The ids of the blocks up to this height have been dropped from the routing tables
+        self.unburied = {} # height -> blocks of the tree at that height whose ids are still in the routing tables
 
         self.env = env
         self.network = None
-        self.root = Node(genesis, self.env.now)
-        self.node_block_map = {genesis.blkid: self.root}
+        self.block_tree = block_tree if block_tree is not None else BlockTree(genesis)
+        self.arrivals = {0: self.env.now} # {block index in block_tree: time at which the block was received}
         self.hashing_power = config["hashing power"]
+        self.tx_random = streams.stream(id, TRANSACTIONS)
+        self.mining_random = streams.stream(id, MINING)
 
     def use_network(self, network):
         """
@@ -65,32 +81,77 @@ class Peer:
         returns: a generator
         """
         while True:
-            r = random.expovariate(1/Ttx) # same as exponential distribution with mean Ttx
-            coins = random.randint(1, 5)
+            r = self.tx_random.expovariate(1/Ttx) # same as exponential distribution with mean Ttx
+            coins = self.tx_random.randint(1, 5)
             yield self.env.timeout(r)
 
-            receiver = random.choice(peers)
-            while receiver == self:
-                receiver = random.choice(peers)
-            # generate a random transaction id by hashing the sender, receiver and time
-            id = hash(str(self.id) + str(receiver.id) + str(self.env.now))
+            transaction = self.new_transaction(peers, coins)
+            if self.network.tx_gossip == "analytic":
+                self.network.flood_transaction(self, transaction)
+            else:
+                yield self.env.process(self.forward_transaction(transaction))
 
-            transaction = Transaction(id, self, receiver, coins, self.env.now)
-            yield self.env.process(self.forward_transaction(transaction))
+            logger.debug("Peer %s generated transaction %s at time %s", self.id, transaction.id, self.env.now)
+
+    def schedule_transactions(self, Ttx, peers):
+        """
+        Fan-out counterpart of generate_transactions, schedules the next transaction of this peer
+
+        Ttx: mean interarrival time of transactions
+        peers: list of all peers in the network
+        """
+        r = self.tx_random.expovariate(1/Ttx) # same as exponential distribution with mean Ttx
+        coins = self.tx_random.randint(1, 5)
+        self.network.schedule(r, TX_GENERATION, self.emit_transaction, Ttx, peers, coins)
+
+    def emit_transaction(self, Ttx, peers, coins):
+        """
+        Create a transaction, gossip it and schedule the next one
+        """
+        transaction = self.new_transaction(peers, coins)
+        if self.network.tx_gossip == "analytic":
+            self.network.flood_transaction(self, transaction)
+        else:
+            self.gossip_transaction(transaction)
+        logger.debug("Peer %s generated transaction %s at time %s", self.id, transaction.id, self.env.now)
+        self.schedule_transactions(Ttx, peers)
+
+    def new_transaction(self, peers, coins):
+        """
+        Create a transaction paying coins to a random peer
+        """
+        receiver = self.tx_random.choice(peers)
+        while receiver == self:
+            receiver = self.tx_random.choice(peers)
+        id = tx_ids.next(self.id)
+
+        if event_trace.enabled:
+            event_trace.record(self.env.now, "tx-generated", self.id, id, receiver=receiver.id, amount=coins)
+        return Transaction(id, self.id, receiver.id, coins, self.env.now)
+
+    def publish_transaction(self, transaction):
+        """
+        Gossip a transaction of this peer taken from a workload (see workload.Replay), the way the
+        transactions it generates itself are
+        """
+        if event_trace.enabled:
+            event_trace.record(self.env.now, "tx-generated", self.id, transaction.id, receiver=transaction.receiver, amount=transaction.amount)
+        if self.network.tx_gossip == "analytic":
+            self.network.flood_transaction(self, transaction)
+        elif self.network.broadcast == "fanout":
+            self.gossip_transaction(transaction)
+        else:
+            self.env.process(self.forward_transaction(transaction))
 
-            print(f"Peer {self.id} generated transaction {id} at time {self.env.now}")
-    
     def receive_transaction(self, sender, transaction):
         """
         Receive a transaction from a sender
         """
-        self.transactions.add(transaction) # add the transaction to the set of transactions 
+        self.add_transaction(transaction)
+        if event_trace.enabled:
+            event_trace.record(self.env.now, "tx-received", self.id, transaction.id, sender=sender.id)
         # change routing table to not send transaction back to sender
-        if sender in self.transaction_routing_table.keys():
-            if transaction.id not in self.transaction_routing_table[sender]:
-                self.transaction_routing_table[sender].append(transaction.id)
-        else:
-            self.transaction_routing_table[sender] = [transaction.id]
+        self.transaction_routing_table.mark(sender, transaction.id)
         yield self.env.process(self.forward_transaction(transaction))
 
     def forward_transaction(self, transaction):
@@ -101,21 +162,46 @@ class Peer:
         """
         # Forward a transaction to all neighbors
         # The structure of self.transaction_routing_table is:
-        # {recipient_peer: [list of TxIDs either sent to or received from this peer]}
+        # {recipient_peer: SeenSet of TxIDs either sent to or received from this peer}
         for n in self.neighbors:
-            id = transaction.id
-            if n in self.transaction_routing_table.keys():
-                # Send this transaction to the neighbor if it has not been sent to it before (to avoid loops)
-                # print(f"Peer {self.id} is sending transaction {id} to peer {n.id}")
-                if id not in self.transaction_routing_table[n]:
-                    self.transaction_routing_table[n].append(id)
-                    yield self.env.process(self.network.send_transaction(self, n, transaction))
-            else:
-                # Send this transaction to that neighbor 
-                # print(f"Peer {self.id} is sending transaction {id} to peer {n.id}")
-                self.transaction_routing_table[n] = [id]
+            # Send this transaction to the neighbor if it has not been sent to it before (to avoid loops)
+            # print(f"Peer {self.id} is sending transaction {transaction.id} to peer {n.id}")
+            if self.transaction_routing_table.mark(n, transaction.id):
                 yield self.env.process(self.network.send_transaction(self, n, transaction))
 
+    def on_transaction(self, sender, transaction):
+        """
+        Fan-out counterpart of receive_transaction, called when a transaction arrives from sender
+        """
+        self.add_transaction(transaction)
+        if event_trace.enabled:
+            event_trace.record(self.env.now, "tx-received", self.id, transaction.id, sender=sender.id)
+        self.transaction_routing_table.mark(sender, transaction.id)
+        self.gossip_transaction(transaction)
+
+    def on_flooded_transaction(self, sender, transaction):
+        """
+        Analytic counterpart of on_transaction, called when a transaction arrives from sender on its
+        fastest path from its origin, nothing is relayed
+        """
+        self.add_transaction(transaction)
+        if event_trace.enabled:
+            event_trace.record(self.env.now, "tx-received", self.id, transaction.id, sender=sender.id)
+
+    def add_transaction(self, transaction):
+        """
+        Add a received transaction to the mempool unless the longest chain already includes it
+        """
+        if not self.longest_chain.includes(transaction):
+            self.mempool.add(transaction)
+
+    def gossip_transaction(self, transaction):
+        """
+        Fan-out counterpart of forward_transaction, schedules the delivery to all neighbors at once
+        """
+        for n in self.neighbors:
+            if self.transaction_routing_table.mark(n, transaction.id):
+                self.network.deliver_transaction(self, n, transaction)
 
     def receive_block(self, sender, block):
         """
@@ -123,84 +209,156 @@ class Peer:
 
         block: block to be received
         """
+        to_create = self.accept_block(sender, block)
+        if to_create is None:
+            return
+        yield self.env.process(self.broadcast_block(block))
+        if to_create:
+            yield self.env.process(self.create_block())
+
+    def on_block(self, sender, block):
+        """
+        Fan-out counterpart of receive_block, called when a block arrives from sender
+        """
+        to_create = self.accept_block(sender, block)
+        if to_create is None:
+            return
+        self.gossip_block(block)
+        if to_create:
+            self.start_mining()
+
+    def missing_transactions(self, block):
+        """
+        Returns the number of transactions of block that this peer cannot take from its mempool or its
+        longest chain, the ones it has to fetch to rebuild a compact block
+        """
+        if self.block_tree.index.get(block.blkid) in self.arrivals:
+            return 0 # Already has the block
+        missing = 0
+        for t in block.transactions:
+            # A peer does not keep the transactions it generates in its mempool, but it knows them
+            if t.id not in self.mempool and t.sender != self.id and not self.longest_chain.includes(t):
+                missing += 1
+        return missing
+
+    def accept_block(self, sender, block):
+        """
+        Validate a block received from sender, add it to the tree and update the longest chain
+
+        returns: None if the block is invalid, otherwise whether a new block should be mined on it
+        """
         # Receive a block from a peer
         #print("receive called")
         isValid = block.validate()
         if not isValid:
             # print("Block is not valid")
-            return
+            if event_trace.enabled:
+                event_trace.record(self.env.now, "block-invalid", self.id, block.blkid, sender=sender.id)
+            return None
 
-        print("Peer ID : ", self.id)
-        print("Block was generated by : ", block.userid)
-        print("Current block ID : ", block.blkid)
-        print("Previous block ID : ", block.prevblock.blkid)
+        logger.debug("Peer %s received block %s generated by %s, previous block %s", self.id, block.blkid, block.userid, block.prevblock.blkid)
         to_create = False
 
-        if block.prevblock.blkid in self.node_block_map.keys():
-            # Add the block to the tree
-            parent = self.node_block_map[block.prevblock.blkid]
-            node = Node(block, self.env.now)
-            print(f"{self.id} : Searching for {node.block.blkid} in {parent.children}")
-            if node.block.blkid not in parent.children:
-                print("Adding the node to the tree")
-                print("Edge from ", parent.block.blkid, " to ", node.block.blkid)
-                parent.children.append(node.block.blkid)
-                self.node_block_map[block.prevblock.blkid] = parent
-                print("New children array : ", self.node_block_map[block.prevblock.blkid].children)
-                pass
-
-            # Update the node_block_map
-            self.node_block_map[block.blkid] = node
+        if self.block_tree.index.get(block.prevblock.blkid) in self.arrivals:
+            # Add the block to the tree, keeping the first arrival if the block comes back through another neighbor
+            index = self.block_tree.add(block)
+            if index not in self.arrivals:
+                logger.debug("Peer %s adding edge from %s to %s", self.id, block.prevblock.blkid, block.blkid)
+                self.arrivals[index] = self.env.now
+                self.add_unburied(block)
+                if metrics.enabled:
+                    metrics.block_received(self, block)
     
 
-            print("Block height", block.height)
-            print("Old longest chain height", self.longest_chain.height)
+            logger.debug("Block height %s, old longest chain height %s", block.height, self.longest_chain.height)
 
             # Assuming currently that block.height has the correct height
             if block.height > self.longest_chain.height:
-                print(f"Peer {self.id} has a new longest chain")
-                self.longest_chain = block
-                self.balance = block.balances[self.id]
+                logger.debug("Peer %s has a new longest chain", self.id)
+                self.set_longest_chain(block)
 
                 # New longest chain created
                 # Simulating PoW
                 to_create = True
 
             elif block.height == self.longest_chain.height and block.timestamp < self.longest_chain.timestamp:
-                print(f"Peer {self.id} has a new longest chain with same height")
-                self.longest_chain = block
-                self.balance = block.balances[self.id]
+                logger.debug("Peer %s has a new longest chain with same height", self.id)
+                self.set_longest_chain(block)
 
                 # New longest chain created
                 # Simulating PoW
                 to_create = True
 
-        # Update routing table to not send block back to sender
-        if sender in self.block_routing_table.keys():
-            if block.blkid not in self.block_routing_table[sender]:
-                self.block_routing_table[sender].append(block.blkid)
-        else:
-            self.block_routing_table[sender] = [block.blkid]
-        yield self.env.process(self.broadcast_block(block))
+        if event_trace.enabled:
+            event_trace.record(self.env.now, "block-received", self.id, block.blkid, sender=sender.id, height=block.height, tip=to_create)
         if to_create:
-            yield self.env.process(self.create_block())
-            pass
-        
+            self.forget_buried(block)
+
+        # Update routing table to not send block back to sender
+        self.block_routing_table.mark(sender, block.blkid)
+        return to_create
+
+    def set_longest_chain(self, block):
+        """
+        Make block the tip of the longest chain and update the mempool and the balance accordingly
+        Only the blocks between the two tips and their fork point are visited, however long the chain
+        """
+        left, joined = self.longest_chain.reorg_path(block)
+        self.mempool.reorg(left, joined)
+        for b in left:
+            self.balance -= b.ledger.deltas.get(self.id, 0)
+        for b in joined:
+            self.balance += b.ledger.deltas.get(self.id, 0)
+        self.longest_chain = block
+
+    def select_transactions(self):
+        """
+        Pick a random subset of the transactions not yet included in the longest chain
+        """
+        num_transactions = self.mining_random.randint(0, min(len(self.mempool), 999))
+        return self.mempool.sample(num_transactions, self.mining_random)
 
     def create_block(self):
         """
         Create a block and broadcast it to all neighbors in the network 
         """
+        block = self.prepare_block()
+        if block is None:
+            return
+
+        yield self.env.timeout(self.mining_delay())
+
+        if self.add_mined_block(block):
+            yield self.env.process(self.broadcast_block(block))
+
+    def start_mining(self):
+        """
+        Fan-out counterpart of create_block, schedules the end of the proof of work as a single event
+        """
+        block = self.prepare_block()
+        if block is None:
+            return
+        self.network.schedule(self.mining_delay(), MINING_COMPLETE, self.finish_mining, block)
+
+    def finish_mining(self, block):
+        """
+        Called when the proof of work on block is done, gossips it if it still extends the longest chain
+        """
+        if self.add_mined_block(block):
+            self.gossip_block(block)
+
+    def prepare_block(self):
+        """
+        Create a block on top of the longest chain
+
+        returns: the block, None if it is invalid
+        """
         # Create a block
         # while True:
-        print("Creating a block")
+        logger.debug("Peer %s creating a block", self.id)
         self.num_gen += 1
         # yield self.env.timeout(self.id*1000)
-        longest_chain_transactions = self.longest_chain.get_all_transactions()
-        valid_transactions = self.transactions - longest_chain_transactions
-        # print(self.transactions, longest_chain_transactions, valid_transactions)
-        num_transactions = random.randint(0, min(len(valid_transactions), 999))
-        transactions = random.sample(valid_transactions, num_transactions)
+        transactions = self.select_transactions()
         longest_chain = self.longest_chain
         block = Block(longest_chain, self.env.now, set(transactions), self.id)
 
@@ -208,127 +366,125 @@ class Peer:
         # So, some transactions might get lost
         isValid = block.validate()
         if not isValid:
-            print("Invalid block created")
-            return
+            logger.debug("Peer %s created an invalid block", self.id)
+            return None
+        return block
+
+    def mining_delay(self):
+        """
+        Returns the time Tk until the proof of work is done, the next block timestamp is tk + Tk
+        """
+        return self.mining_random.expovariate(self.hashing_power/self.network.interarrival)
 
-        # Next block timestamp (tk + Tk)
-        Tk = random.expovariate(self.hashing_power/self.network.interarrival)
+    def add_mined_block(self, block):
+        """
+        Add a block mined by this peer to the tree if the longest chain has not changed in the meantime
 
-        yield self.env.timeout(Tk)
-        
+        returns: True if the block was added
+        """
         new_longest_chain = self.longest_chain
-        if new_longest_chain.blkid == longest_chain.blkid:
-            print("Chain is same")
-            print("Peer ID : ", self.id)
-            print("Creating block with block ID : ", block.blkid)
-            print("Previous block ID : ", block.prevblock.userid)
+        if new_longest_chain.blkid == block.prevblock.blkid:
+            logger.debug("Chain is same, peer %s mined block %s on a block of %s", self.id, block.blkid, block.prevblock.userid)
+            if event_trace.enabled:
+                event_trace.record(self.env.now, "block-mined", self.id, block.blkid, height=block.height, transactions=len(block.transactions))
             # Modify the longest chain and add the block to the tree
-            self.longest_chain = block
-            node = Node(block, self.env.now)
-            parent = self.node_block_map[block.prevblock.blkid]
-            print(f"{self.id} : Searching for {node.block.blkid} in {parent.children}")
-            if node.block.blkid not in parent.children:
-                print("Adding the node to the tree")
-                print("Edge from ", parent.block.blkid, " to ", node.block.blkid)
-                parent.children.append(node.block.blkid)
-                self.node_block_map[block.prevblock.blkid] = parent
-                print("New children array : ", self.node_block_map[block.prevblock.blkid].children)
-                pass
-
-            self.node_block_map[block.blkid] = node
-            yield self.env.process(self.broadcast_block(block))
-            # else:
-                # yield self.env.process(self.create_block())
-            # self.print_tree(f"debug_plots/tree_{self.id}.dot")
-
+            self.set_longest_chain(block)
+            self.forget_buried(block)
+            logger.debug("Peer %s adding edge from %s to %s", self.id, block.prevblock.blkid, block.blkid)
+            self.arrivals[self.block_tree.add(block)] = self.env.now
+            self.add_unburied(block)
+            if metrics.enabled:
+                metrics.block_mined(self, block)
+            return True
+        return False
 
     def broadcast_block(self, block):
         """
         Broadcast the block to all the neighbors in the network and update the block_routing_table
         The structure of self.block_routing_table is:
-        {recipient_peer: [list of blockIDs either sent to or received from this peer]}
+        {recipient_peer: SeenSet of blockIDs either sent to or received from this peer}
         """
 
         # Same as sending transaction
         for n in self.neighbors:
-            id = block.blkid
-            if n in self.block_routing_table.keys():
+            if self.block_routing_table.mark(n, block.blkid):
                 # Send this block to that neighbor some how
-                if id not in self.block_routing_table[n]:
-                    print(f"{self.id} Broadcasting block to {n.id}")
-                    self.block_routing_table[n].append(id)
-
-                    yield self.env.process(self.network.send_block(self, n, block))
-            else:
-                # Send this block to that neighbor some how
-                print(f"{self.id} Broadcasting block to {n.id}")
-                self.block_routing_table[n] = [id]
-
+                logger.debug("%s Broadcasting block to %s", self.id, n.id)
                 yield self.env.process(self.network.send_block(self, n, block))
-                # print("Block sent")
-            print("Block sent")
 
-    def print_tree(self, filename):
+    def gossip_block(self, block):
         """
-        Print the tree in a file using graphviz
+        Fan-out counterpart of broadcast_block, schedules the delivery to all neighbors at once
         """
-        f = graphviz.Digraph(filename, format='png')
+        for n in self.neighbors:
+            if self.block_routing_table.mark(n, block.blkid):
+                logger.debug("%s Broadcasting block to %s", self.id, n.id)
+                self.network.deliver_block(self, n, block)
 
-        reverse_mapping = {}
+    def add_unburied(self, block):
+        """
+        Keep track of a block added to the tree, for forget_buried
+        """
+        if self.bury_depth is None:
+            return
+        # A block of a branch that is already buried is dropped with the next height
+        height = max(block.height, self.buried_height + 1)
+        self.unburied.setdefault(height, []).append(block)
 
-        for id, blkid in enumerate(self.node_block_map.keys()):
-            reverse_mapping[blkid] = id
-            #f.node(str(id), str(blkid) + " : " + str(self.node_block_map[blkid].timestamp))
-            if self.node_block_map[blkid].block.prevblock is not None:
-                data = str(blkid) + " : " + str(self.node_block_map[blkid].block.userid) + " : " + str(self.node_block_map[blkid].block.prevblock.blkid) + "\n"
-                for tx in self.node_block_map[blkid].block.transactions:
+    def forget_buried(self, tip):
+        """
+        Drop the ids of the transactions and blocks buried bury_depth blocks below tip from the routing tables,
+        the ones of the longest chain and of the branches that left it alike
+        Nothing is gossiped that deep anymore, so this keeps the tables bounded over long runs
+        """
+        if self.bury_depth is None:
+            return
+        # Every height up to the buried one, the tip can move up several heights at once in a reorg
+        blocks = []
+        while self.buried_height < tip.height - self.bury_depth:
+            self.buried_height += 1
+            blocks.extend(self.unburied.pop(self.buried_height, ()))
+        if blocks:
+            self.transaction_routing_table.forget([t.id for block in blocks for t in block.transactions])
+            self.block_routing_table.forget([block.blkid for block in blocks])
+
+    def dot_source(self):
+        """
+        Returns the tree of this peer in the DOT language
+        Nodes are numbered by their index in the block tree, so peers that saw the same blocks have the same source
+        """
+        lines = ["digraph {"]
+        indices = sorted(self.arrivals.keys())
+        for index in indices:
+            block = self.block_tree.blocks[index]
+            if block.prevblock is not None:
+                data = str(block.blkid) + " : " + str(block.userid) + " : " + str(block.prevblock.blkid) + "\n"
+                for tx in sorted(block.transactions, key=transaction_id):
                     data += str(tx) + "\n"
-
-                f.node(str(id), data)
             else:
-                f.node(str(id), str(blkid) + " : " + str(self.node_block_map[blkid].block.userid))
+                data = str(block.blkid) + " : " + str(block.userid)
+            lines.append(f'\t{index} [label="{data}"]')
 
-        for k, v in self.node_block_map.items():
-            if(v.block.prevblock is not None):
-                print(k, v.block.blkid, v.block.prevblock.blkid)
-            else:
-                print(k, v.block.blkid)
-            print(v.children)
-
-        print()
-        print()
-        print("Peer ID : ", self.id)
-
-        visited = set()
-        edges = set()
-        def dfs(visited, nodeBlkid):
-            if nodeBlkid not in visited:
-                visited.add(nodeBlkid)
-                print()
-                print("Node : ", nodeBlkid)
-                print("Children : ", self.node_block_map[nodeBlkid].children)
-                for childID in self.node_block_map[nodeBlkid].children:
-                    f.edge(str(reverse_mapping[nodeBlkid]), str(reverse_mapping[childID]))
-                    print(f"{nodeBlkid} -> {childID}")
-                    dfs(visited, childID)
-                print()
-
-        dfs(visited, self.root.block.blkid)
-
-        print()
-        print()
-
-        for e in edges:
-            f.edge(e[0], e[1])
-        f.render()
+        # Every block of the peer has its parent too, so the edges of its view are the ones to its blocks
+        for index in indices:
+            parent = self.block_tree.parent[index]
+            if parent != -1:
+                lines.append(f"\t{parent} -> {index}")
+        lines.append("}")
+        return "\n".join(lines) + "\n"
 
-    def save_tree(self, filename):
+    def print_tree(self, filename):
         """
-        Save the tree in a file using pickle
+        Write the tree in a DOT file, render.py turns it into a PNG
         """
-        if not os.path.exists(os.path.dirname(filename)):
-            os.makedirs(os.path.dirname(filename))
+        logger.debug("Peer ID : %s", self.id)
+        with open(filename, "w") as f:
+            f.write(self.dot_source())
 
+    def count_longest(self):
+        """
+        Returns the number of blocks mined by this peer that ended in its longest chain
+        """
         num_longest = 0
 
         curr_block = self.longest_chain
@@ -340,6 +496,18 @@ class Peer:
                 
             curr_block = prev_block
             prev_block = curr_block.prevblock
+        return num_longest
+
+    def save_tree(self, filename):
+        """
+        Save the tree in a text file, treeio.export writes the trees of all the peers in a binary file
+
+        returns: the number of blocks mined by this peer that ended in its longest chain
+        """
+        if not os.path.exists(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+
+        num_longest = self.count_longest()
 
         with open(filename, 'w') as f:
 
@@ -355,22 +523,12 @@ class Peer:
             else:
                 print("Ratio : Undefined", file=f)
 
-            reverse_mapping = {}
-            for id, blkid in enumerate(self.node_block_map.keys()):
-                reverse_mapping[blkid] = id
-
-            visited = set()
-            def dfs(visited, nodeBlkid):
-                if nodeBlkid not in visited:
-                    visited.add(nodeBlkid)
-                    print(file=f)
-                    print("Block Hash : ", self.node_block_map[nodeBlkid].block.blkid, file=f)
-                    if(self.node_block_map[nodeBlkid].block.prevblock is not None):
-                        print("Parent Hash : ", self.node_block_map[nodeBlkid].block.prevblock.blkid, file=f)
-                    print("Received at : ", self.node_block_map[nodeBlkid].timestamp, file=f)
-                    print(file=f)
-
-                    for childID in self.node_block_map[nodeBlkid].children:
-                        dfs(visited, childID)
-
-            dfs(visited, self.root.block.blkid)
\ No newline at end of file
+            for index in self.block_tree.dfs(self.arrivals):
+                block = self.block_tree.blocks[index]
+                print(file=f)
+                print("Block Hash : ", block.blkid, file=f)
+                if(block.prevblock is not None):
+                    print("Parent Hash : ", block.prevblock.blkid, file=f)
+                print("Received at : ", self.arrivals[index], file=f)
+                print(file=f)
+        return num_longest
\ No newline at end of file
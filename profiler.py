@@ -0,0 +1,181 @@
+import functools
+import inspect
+import json
+import logging
+import math
+import time
+from block import Block
+from network import Network
+from peer import Peer
+
+logger = logging.getLogger(__name__)
+
+# Methods timed by the profiler, the fan-out callbacks along with their serial counterparts
+TARGETS = [
+    (Peer, "receive_block"), (Peer, "on_block"),
+    (Peer, "create_block"), (Peer, "start_mining"), (Peer, "finish_mining"),
+    (Peer, "receive_transaction"), (Peer, "on_transaction"), (Peer, "on_flooded_transaction"),
+    (Block, "validate"), (Block, "get_all_transactions"),
+    (Network, "send_transaction"), (Network, "send_block"),
+    (Network, "deliver_transaction"), (Network, "deliver_block"), (Network, "reconstruct_block"),
+    (Network, "flood_transaction"),
+]
+
+
+class Timings:
+    """
+    Number of calls and histogram of the wall time of a method, in power of two buckets of nanoseconds
+    A simpy process can still be waiting at the end of the run, its time so far is in the total but
+    it is only in the histogram once completed
+    """
+    def __init__(self):
+        self.calls = 0
+        self.completed = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0]*64
+
+    def add(self, seconds):
+        """
+        Add a completed call
+        """
+        self.calls += 1
+        self.total += seconds
+        self.complete(seconds)
+
+    def complete(self, seconds):
+        """
+        Add the time of a completed call to the histogram
+        """
+        self.completed += 1
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[min(63, max(0, int(seconds*1e9)).bit_length())] += 1
+
+    def report(self):
+        return {
+            "calls": self.calls,
+            "completed": self.completed,
+            "total (s)": self.total,
+            "mean (us)": 1e6*self.total/self.calls if self.calls else None,
+            "max (us)": 1e6*self.max,
+            # Upper bound of each bucket in microseconds: number of calls
+            "histogram (us)": {f"{2**i/1000:g}": count for i, count in enumerate(self.buckets) if count},
+        }
+
+
+def timed_function(function, timings):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timings.add(time.perf_counter() - start)
+    return wrapper
+
+
+def timed_generator(function, timings):
+    # A simpy process runs in steps between its yields, only the time spent in the steps is counted
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        timings.calls += 1
+        generator = function(*args, **kwargs)
+        total = 0.0
+        value = None
+        error = None
+        while True:
+            start = time.perf_counter()
+            try:
+                item = generator.send(value) if error is None else generator.throw(error)
+            except StopIteration as stop:
+                seconds = time.perf_counter() - start
+                timings.total += seconds
+                timings.complete(total + seconds)
+                return stop.value
+            seconds = time.perf_counter() - start
+            timings.total += seconds
+            total += seconds
+            value = None
+            error = None
+            try:
+                value = yield item
+            except BaseException as thrown:
+                error = thrown
+    return wrapper
+
+
+class Profiler:
+    """
+    Opt-in instrumentation of the hot methods of Peer, Block and Network
+    The methods are replaced by timing wrappers on enable and put back on disable, so nothing is
+    added to the simulation when profiling is off.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.originals = []
+        self.timings = {}
+
+    def enable(self):
+        """
+        Replace the methods of TARGETS by timed ones, before the simulation is built so that the
+        callbacks it schedules are the timed ones
+        """
+        if self.enabled:
+            return
+        self.timings = {}
+        for cls, name in TARGETS:
+            function = cls.__dict__[name]
+            timings = self.timings[f"{cls.__name__}.{name}"] = Timings()
+            if inspect.isgeneratorfunction(function):
+                wrapper = timed_generator(function, timings)
+            else:
+                wrapper = timed_function(function, timings)
+            self.originals.append((cls, name, function))
+            setattr(cls, name, wrapper)
+        self.enabled = True
+
+    def disable(self):
+        """
+        Put the original methods back
+        """
+        for cls, name, function in self.originals:
+            setattr(cls, name, function)
+        self.originals = []
+        self.enabled = False
+
+    def report(self, wall, simulated, events, counts=None):
+        """
+        Returns the report of a run as a dictionary
+
+        wall: wall time of the run in seconds
+        simulated: simulated time of the run in ms
+        events: number of events processed
+        counts: {event type: number of events} when the scheduler counts them
+        """
+        report = {
+            "wall time (s)": wall,
+            "simulated time (ms)": simulated,
+            "simulated ms per wall s": simulated/wall if wall else None,
+            "events": events,
+            "events per wall s": events/wall if wall else None,
+        }
+        if counts is not None:
+            report["events per type"] = counts
+        report["methods"] = {name: timings.report() for name, timings in self.timings.items() if timings.calls}
+        return report
+
+    def write(self, filename, report):
+        """
+        Write a report as JSON and log the methods that took the most time
+        """
+        with open(filename, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info("Profile : %.0f events per wall s, %.0f simulated ms per wall s, report in %s",
+                    report["events per wall s"] or math.nan, report["simulated ms per wall s"] or math.nan, filename)
+        methods = sorted(report["methods"].items(), key=lambda item: -item[1]["total (s)"])
+        for name, method in methods[:5]:
+            logger.info("  %-28s %9d calls %9.3f s %9.2f us mean", name, method["calls"], method["total (s)"], method["mean (us)"])
+
+
+profiler = Profiler()
@@ -0,0 +1,117 @@
+"""
+Writes the trees of the peers as DOT files and renders them to PNG
+
+Peers that saw the same blocks have the same tree, it is written once and the other peers' files are
+links to it. graphviz is only imported by the processes that render.
+
+python3 render.py plots_10_0.5_0.5_100.0_600.0_20000.0 --jobs 8
+"""
+import argparse
+import concurrent.futures
+import glob
+import logging
+import os
+import shutil
+
+logger = logging.getLogger(__name__)
+
+
+def remove(filename):
+    """
+    Remove filename if it exists, before writing it: it can be a hard link left by a previous run in
+    the same directory, writing through it would change the files of the other peers too
+    """
+    if os.path.lexists(filename):
+        os.remove(filename)
+
+
+def link(source, destination):
+    """
+    Make destination a hard link to source, or a copy where links are not supported
+    """
+    remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+def write_dot(peers, directory):
+    """
+    Write the tree of every peer to directory/tree_<peer id>_<longest chain height>.dot
+
+    returns: {file of a distinct tree: files of the other peers with the same tree}
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    trees = {} # DOT source -> file it was written to
+    duplicates = {}
+    for peer in peers:
+        filename = os.path.join(directory, f"tree_{peer.id}_{peer.longest_chain.height}.dot")
+        source = peer.dot_source()
+        first = trees.get(source)
+        if first is None:
+            remove(filename)
+            with open(filename, "w") as f:
+                f.write(source)
+            trees[source] = filename
+            duplicates[filename] = []
+        else:
+            link(first, filename)
+            duplicates[first].append(filename)
+    logger.info("Trees : %s distinct out of %s peers", len(trees), len(peers))
+    return duplicates
+
+
+def render_file(filename):
+    """
+    Render a DOT file to a PNG file next to it
+
+    returns: the PNG file
+    """
+    import graphviz # Only needed here, headless runs never import it
+    png = os.path.splitext(filename)[0] + ".png"
+    remove(png)
+    graphviz.render("dot", "png", filename, outfile=png)
+    return png
+
+
+def render(duplicates, jobs=None):
+    """
+    Render the distinct trees in a pool of jobs processes (in this process if jobs is 1),
+    then link the PNG files of the duplicates to them
+
+    duplicates: as returned by write_dot
+    """
+    if jobs == 1:
+        pngs = [render_file(filename) for filename in duplicates]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+            pngs = list(pool.map(render_file, duplicates))
+
+    for filename, png in zip(duplicates, pngs):
+        for duplicate in duplicates[filename]:
+            link(png, os.path.splitext(duplicate)[0] + ".png")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the DOT files of runs made with --no-render")
+    parser.add_argument("directories", nargs="+", help="plots_ directories written by run.py")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="number of rendering processes")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    # Linked files are rendered once
+    duplicates = {}
+    inodes = {}
+    for directory in args.directories:
+        for filename in sorted(glob.glob(os.path.join(directory, "*.dot"))):
+            key = (os.stat(filename).st_dev, os.stat(filename).st_ino)
+            if key in inodes:
+                duplicates[inodes[key]].append(filename)
+            else:
+                inodes[key] = filename
+                duplicates[filename] = []
+    render(duplicates, args.jobs)
+    logger.info("Rendered %s distinct trees out of %s files", len(duplicates), sum(1 + len(d) for d in duplicates.values()))
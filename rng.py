@@ -0,0 +1,100 @@
+import numpy as np
+
+# Purposes of the random streams, the spawn key of a stream is (purpose, peer id)
+TRANSACTIONS = 0 # Interarrival times, amounts and receivers of the transactions generated by a peer
+MINING = 1 # Proof of work delays and block contents of a peer
+LATENCY = 2 # Queueing delays of the messages sent by a peer
+
+BLOCK_SIZE = 4096 # Largest number of variates drawn at once when a stream runs out
+FIRST_BLOCK_SIZE = 16 # Blocks start this small and double, so that the many streams of a large network stay small
+
+
+class Stream:
+    """
+    Random variates for one peer and purpose, drawn from a numpy generator in blocks of up to BLOCK_SIZE
+    The methods are named after the ones of the random module so either can be used
+    """
+    def __init__(self, seed_sequence, block_size=BLOCK_SIZE):
+        """
+        seed_sequence: numpy SeedSequence of the stream
+        block_size: largest number of variates drawn at once
+        """
+        self.generator = np.random.Generator(np.random.PCG64(seed_sequence))
+        self.block_size = block_size
+        self.exponentials = iter(())
+        self.exponential_size = FIRST_BLOCK_SIZE
+        self.uniforms = iter(())
+        self.uniform_size = FIRST_BLOCK_SIZE
+
+    def expovariate(self, lambd):
+        """
+        Returns an exponential variate of rate lambd
+        """
+        try:
+            return next(self.exponentials)/lambd
+        except StopIteration:
+            self.exponentials = iter(self.generator.standard_exponential(self.exponential_size).tolist())
+            self.exponential_size = min(2*self.exponential_size, self.block_size)
+            return next(self.exponentials)/lambd
+
+    def random(self):
+        """
+        Returns a uniform variate in [0, 1)
+        """
+        try:
+            return next(self.uniforms)
+        except StopIteration:
+            self.uniforms = iter(self.generator.random(self.uniform_size).tolist())
+            self.uniform_size = min(2*self.uniform_size, self.block_size)
+            return next(self.uniforms)
+
+    def randint(self, a, b):
+        """
+        Returns a random integer in [a, b]
+        """
+        return a + int(self.random()*(b - a + 1))
+
+    def choice(self, seq):
+        """
+        Returns a random element of the non-empty sequence seq
+        """
+        return seq[int(self.random()*len(seq))]
+
+    def sample(self, population, k):
+        """
+        Returns k distinct elements of the sequence population
+        """
+        return [population[i] for i in self.generator.choice(len(population), k, replace=False).tolist()]
+
+
+class Streams:
+    """
+    Independent streams keyed by peer and purpose, all spawned from one seed
+    Each stream only depends on the seed and its key, not on the order in which they are created
+    """
+    def __init__(self, seed=None):
+        """
+        seed: integer seed, None to draw one from the operating system
+        """
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        """
+        Start again from seed, before starting a new run in the same process
+        """
+        self.entropy = np.random.SeedSequence(seed).entropy
+        self.streams = {}
+
+    def stream(self, peer, purpose):
+        """
+        Returns the stream of peer for purpose
+        """
+        key = (purpose, peer)
+        stream = self.streams.get(key)
+        if stream is None:
+            stream = Stream(np.random.SeedSequence(self.entropy, spawn_key=key))
+            self.streams[key] = stream
+        return stream
+
+
+streams = Streams() # Shared by all the peers of a run
@@ -0,0 +1,83 @@
+from collections import OrderedDict
+
+
+class SeenSet:
+    """
+    Set of the ids either sent to or received from one neighbor
+    With a capacity, the least recently used ids are dropped once it is full
+    """
+    def __init__(self, capacity=None):
+        """
+        capacity: maximum number of ids kept (None for unbounded)
+        """
+        self.capacity = capacity
+        self.ids = set() if capacity is None else OrderedDict()
+
+    def __contains__(self, id):
+        return id in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, id):
+        """
+        Add id to the set, returns False if it was already there
+        """
+        if self.capacity is None:
+            if id in self.ids:
+                return False
+            self.ids.add(id)
+            return True
+
+        if id in self.ids:
+            self.ids.move_to_end(id)
+            return False
+        self.ids[id] = None
+        if len(self.ids) > self.capacity:
+            self.ids.popitem(last=False)
+        return True
+
+    def discard(self, id):
+        """
+        Remove id from the set if present
+        """
+        if self.capacity is None:
+            self.ids.discard(id)
+        else:
+            self.ids.pop(id, None)
+
+
+class RoutingTable:
+    """
+    Routing table of a peer, used to not send an id back to a neighbor that already has it
+    The structure is {neighbor: SeenSet of ids either sent to or received from this neighbor}
+    """
+    def __init__(self, capacity=None):
+        """
+        capacity: maximum number of ids kept per neighbor (None for unbounded)
+        """
+        self.capacity = capacity
+        self.seen = {}
+
+    def mark(self, neighbor, id):
+        """
+        Record id as exchanged with neighbor, returns False if it already was
+        """
+        seen = self.seen.get(neighbor)
+        if seen is None:
+            seen = self.seen[neighbor] = SeenSet(self.capacity)
+        return seen.add(id)
+
+    def forget(self, ids):
+        """
+        Drop ids from the sets of all neighbors
+        """
+        for id in ids:
+            for seen in self.seen.values():
+                seen.discard(id)
+
+    def size(self):
+        """
+        Returns the total number of ids stored
+        """
+        return sum(len(seen) for seen in self.seen.values())
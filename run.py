@@ -1,12 +1,32 @@
 import argparse
+import logging
+import os
 import simpy
 import time
 from peer import Peer
-from block import Block
+from block import Block, validation_cache
+from transaction import tx_ids
+from rng import streams
+from ledger import Ledger
+from tree import BlockTree
 from network import Network
+from engine import Engine, EVENT_NAMES
+from eventlog import event_trace
+from metrics import metrics
+from profiler import profiler
+import cProfile
+import checkpoint
+import render
+import sharded
+import treeio
+import workload
+import topology
 import random
 
-if __name__ == "__main__":
+def parse_args(argv=None):
+    """
+    Parse the command line arguments of the simulator
+    """
     parser = argparse.ArgumentParser(description="P2P currency simulator")
     parser.add_argument("--n", type=int, default=10, help="Number of peers")
     parser.add_argument("--z0", type=float, default=0.5, help = "percent of slow peers")
@@ -14,11 +34,66 @@ if __name__ == "__main__":
     parser.add_argument("--Ttx", type=float, default=0.5, help = "mean interarrival time of transactions")
     parser.add_argument("--time", type=float, default=100, help = "simulation time")
     parser.add_argument("--I", type=float, default=0.5, help = "mean interarrival time of blocks")
+    parser.add_argument("--route-capacity", type=int, default=None, help = "maximum number of ids kept per neighbor in the routing tables (LRU)")
+    parser.add_argument("--route-depth", type=int, default=None, help = "forget routed ids once buried this many blocks deep")
+    parser.add_argument("--mempool-capacity", type=int, default=None, help = "maximum number of pending transactions per peer, the oldest are evicted")
+    parser.add_argument("--broadcast", choices=["serial", "fanout"], default=None, help = "send to neighbors one after the other or all at once (default: serial with simpy, fanout with the heap engine)")
+    parser.add_argument("--topology", choices=topology.KINDS, default="random", help = "kind of random graph connecting the peers")
+    parser.add_argument("--degree", type=int, default=6, help = "mean degree of the regular, er and scale-free topologies")
+    parser.add_argument("--workload", default=None, help = "replay the transactions of this workload file, generated from --n, --Ttx, --time and --seed if it does not exist")
+    parser.add_argument("--tx-gossip", choices=["flood", "analytic"], default="flood", help = "relay transactions hop by hop, or schedule their arrival at every peer from the fastest paths")
+    parser.add_argument("--flood-cache", type=int, default=1024, help = "number of origins whose fastest paths are kept with --tx-gossip analytic")
+    parser.add_argument("--relay", choices=["full", "compact"], default="full", help = "send whole blocks, or compact blocks rebuilt from the mempool of the receiver")
+    parser.add_argument("--engine", choices=["simpy", "heap"], default="simpy", help = "event engine, heap runs the serial broadcast too with --broadcast serial")
+    parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default="INFO", help = "DEBUG logs every event")
+    parser.add_argument("--trace-file", default=None, help = "write a JSON-lines trace of the events to this file")
+    parser.add_argument("--seed", type=int, default=None, help = "random seed")
+    parser.add_argument("--suffix", default="", help = "appended to the names of the output directories")
+    parser.add_argument("--checkpoint-interval", type=float, default=None, help = "save the state every this much simulation time (heap engine)")
+    parser.add_argument("--resume", action="store_true", help = "continue from the checkpoint of a run with the same arguments (heap engine)")
+    parser.add_argument("--no-render", action="store_true", help = "only write the DOT files of the trees, render them later with render.py")
+    parser.add_argument("--render-jobs", type=int, default=None, help = "number of processes rendering the trees (default: all CPUs)")
+    parser.add_argument("--metrics-interval", type=float, default=None, help = "log a snapshot of the metrics every this much simulation time")
+    parser.add_argument("--metrics-file", default=None, help = "also write the metrics snapshots to this file as JSON lines")
+    parser.add_argument("--profile", action="store_true", help = "time the hot methods and write a JSON report to profile_<...>.json")
+    parser.add_argument("--pstats", default=None, help = "also run cProfile and dump its statistics to this file")
+    parser.add_argument("--tree-format", choices=["binary", "text"], default="binary", help = "one trees.bin file for all the peers, or a .tree text file per peer")
+    parser.add_argument("--workers", type=int, default=None, help = "split the peers across this many processes (heap engine)")
+
+    args = parser.parse_args(argv)
+    if args.broadcast is None:
+        args.broadcast = "fanout" if args.engine == "heap" else "serial"
+    if (args.checkpoint_interval is not None or args.resume) and (args.engine != "heap" or args.broadcast != "fanout"):
+        # The processes of the serial mode are generators, which cannot be saved
+        parser.error("checkpoints need --engine heap with the fan-out broadcast")
+    if args.workers is not None:
+        if args.engine != "heap" or args.broadcast != "fanout":
+            parser.error("--workers needs --engine heap with the fan-out broadcast")
+        # These need the state of all the peers in one process as the run goes
+        if args.checkpoint_interval is not None or args.resume or args.metrics_interval is not None or args.metrics_file is not None \
+                or args.profile or args.trace_file is not None:
+            parser.error("--workers does not support checkpoints, metrics, profiling or traces")
+        if args.relay == "compact":
+            # Fetching missing transactions draws from the latency stream of the sender in the worker of the receiver
+            parser.error("--workers needs --relay full")
+    return args
 
-    args = parser.parse_args()
+def build_simulation(args, env=None):
+    """
+    Create the peers and the network and start the transaction and block generation
 
-    env = simpy.Environment()  # simulated in simpy
+    args: parsed arguments
+    env: simpy environment or Engine to use (a new one of the kind given by args.engine if None)
+
+    returns: env, peers, network
+    """
+    if env is None and args.engine == "heap":
+        env = Engine()
+    elif env is None:
+        env = simpy.Environment()  # simulated in simpy
+    streams.seed(random.getrandbits(64)) # The random streams of the peers follow the seed of the random module
     genesis = Block(None, 0, set([]), -1) # genesis block
+    block_tree = BlockTree(genesis) # blocks shared by all the peers
 
     num_slow = int(args.n*args.z0)
     slow_peers = random.sample(range(args.n+1), num_slow)
@@ -29,7 +104,8 @@ if __name__ == "__main__":
     # Generate the peers
     peers = []
     for i in range(args.n):
-        config = {}
+        config = {"routing capacity": args.route_capacity, "routing bury depth": args.route_depth,
+                  "mempool capacity": args.mempool_capacity}
         if i in slow_peers:
             config["speed"] = "slow"
         else:
@@ -42,25 +118,149 @@ if __name__ == "__main__":
             config["cpu"] = "high"
             config["hashing power"] = 10/(10*args.n - 9*num_low) # 10 times the hashing power of a low CPU peer
 
-        p = Peer(i, genesis, env, config)
+        p = Peer(i, genesis, env, config, block_tree)
         peers.append(p)
-        genesis.balances = {i: 0 for i in range(args.n)}
+    genesis.ledger = Ledger(None, {i: 0 for i in range(args.n)})
 
     # Generate the network
-    network = Network(peers, args.I, env)
+    network = Network(peers, args.I, env, args.broadcast, args.topology, args.degree, args.relay, args.tx_gossip, args.flood_cache)
 
     for peer in peers:
         peer.use_network(network)
-        env.process(peer.generate_transactions(args.Ttx, peers))
-        if random.random() < 0.25:
-            env.process(peer.create_block())
+        if args.broadcast == "fanout":
+            if args.workload is None:
+                peer.schedule_transactions(args.Ttx, peers)
+            if random.random() < 0.25:
+                peer.start_mining()
+        else:
+            if args.workload is None:
+                env.process(peer.generate_transactions(args.Ttx, peers))
+            if random.random() < 0.25:
+                env.process(peer.create_block())
+    if args.workload is not None:
+        # A single driver instead of a generator per peer
+        network.replay = workload.Replay(args.workload, peers, network)
+        network.replay.start()
+
+    return env, peers, network
+
+def output_name(args):
+    """
+    Returns the name of the output directories of a run, without the plots_ or trees_ prefix
+    """
+    return f"{args.n}_{args.z0}_{args.z1}_{args.Ttx}_{args.I}_{args.time}{args.suffix}"
+
+def next_multiple(now, interval):
+    """
+    Returns the first multiple of interval after now, infinity if interval is None
+    """
+    if interval is None:
+        return float("inf")
+    return (now//interval + 1)*interval
+
+def run_simulation(args):
+    """
+    Run a whole simulation and write the trees of all the peers
 
+    returns: a list with the results of every peer
+    """
+    checkpoint_file = f"checkpoints_{output_name(args)}/checkpoint.pkl.z"
+    if args.profile:
+        # Before building, so that the callbacks scheduled are the timed methods
+        profiler.enable()
+    if args.resume:
+        env, peers, network = checkpoint.load(checkpoint_file)
+    else:
+        if args.seed is not None:
+            random.seed(args.seed)
+        validation_cache.reset()
+        tx_ids.reset()
+        if args.workload is not None and not os.path.exists(args.workload):
+            total = workload.generate(args.workload, args.n, args.Ttx, args.time, args.seed)
+            logging.info("Workload of %s transactions written to %s", total, args.workload)
+        if args.trace_file is not None:
+            event_trace.open(args.trace_file)
+        if args.workers is not None:
+            # The workers run the whole simulation, env is left at its end
+            env, peers, network = sharded.run(args, build_simulation)
+        else:
+            env, peers, network = build_simulation(args)
+        if args.metrics_interval is not None or args.metrics_file is not None:
+            metrics.start(peers, args.metrics_file)
+
+    # The heap engine counts all its events, simpy only the ones of the fan-out callbacks
+    counted = args.engine == "heap" or args.broadcast == "fanout"
+    if args.profile:
+        if counted:
+            counts_before = list(network.scheduler.counts)
+        else:
+            # simpy does not count its events, count the steps of the environment
+            steps = [0]
+            step = env.step
+            def counted_step():
+                steps[0] += 1
+                step()
+            env.step = counted_step
+    if args.pstats is not None:
+        cprofile = cProfile.Profile()
+        cprofile.enable()
+    start = time.perf_counter()
+    start_time = env.now
+
+    # Stop at each multiple of the intervals to save a checkpoint or a snapshot of the metrics
+    checkpointer = checkpoint.Checkpointer(checkpoint_file)
+    next_checkpoint = next_multiple(env.now, args.checkpoint_interval)
+    next_snapshot = next_multiple(env.now, args.metrics_interval)
+    while min(next_checkpoint, next_snapshot) < args.time:
+        until = min(next_checkpoint, next_snapshot)
+        env.run(until=until)
+        if until == next_snapshot:
+            metrics.snapshot(env.now, peers)
+            next_snapshot += args.metrics_interval
+        if until == next_checkpoint:
+            checkpointer.save(checkpoint.capture(env, peers, network))
+            next_checkpoint += args.checkpoint_interval
+    checkpointer.wait()
     env.run(until=args.time)
 
+    wall = time.perf_counter() - start
+    if args.pstats is not None:
+        cprofile.disable()
+        cprofile.dump_stats(args.pstats)
+    if args.profile:
+        profiler.disable()
+        if counted:
+            counts = {name: count - before for name, count, before in zip(EVENT_NAMES, network.scheduler.counts, counts_before)}
+            report = profiler.report(wall, env.now - start_time, sum(counts.values()), counts)
+        else:
+            report = profiler.report(wall, env.now - start_time, steps[0])
+        profiler.write(f"profile_{output_name(args)}.json", report)
+    event_trace.close()
+    if metrics.enabled:
+        metrics.snapshot(env.now, peers)
+        metrics.close()
+    logging.info(validation_cache.summary())
+    logging.info(network.relay_summary())
+    if counted:
+        logging.info(network.scheduler.summary())
+
     # time.sleep(10)
+    results = []
+    name = output_name(args)
+    duplicates = render.write_dot(peers, f"plots_{name}")
+    if not args.no_render:
+        render.render(duplicates, args.render_jobs)
+    if args.tree_format == "binary":
+        return treeio.export(peers, f"trees_{name}/{treeio.FILENAME}")
     for peer in peers:
         longest_chain = peer.longest_chain.height
-        peer.print_tree(f"plots_{args.n}_{args.z0}_{args.z1}_{args.Ttx}_{args.I}_{args.time}/tree_{peer.id}_{longest_chain}.dot")
-        peer.save_tree(f"trees_{args.n}_{args.z0}_{args.z1}_{args.Ttx}_{args.I}_{args.time}/tree_{peer.id}_{longest_chain}.tree")
+        num_longest = peer.save_tree(f"trees_{name}/tree_{peer.id}_{longest_chain}.tree")
+        results.append({"peer": peer.id, "cpu": peer.cpu, "speed": peer.speed, "created": peer.num_gen, "longest": num_longest})
+    return results
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(level=args.log_level, format="%(message)s")
+    run_simulation(args)
 
 # python3 run.py --n 50 --z0 0.8 --z1 0.3 --Ttx 1 --I 1 --time 1000
\ No newline at end of file
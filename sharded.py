@@ -0,0 +1,297 @@
+"""
+Parallel runs of the heap engine: the peers are split across worker processes by topology, each
+worker runs the events of its own peers with its own Engine.
+
+The workers are synchronized conservatively in time windows. A message between two peers takes at
+least the propagation delay of their link, at least 10 ms, so a message sent by a peer of one worker
+to a peer of another one during a window of the length of the smallest delay of the links between
+workers arrives after the window. The workers run a window, then hand their outgoing messages and the
+blocks they mined to the main process, which passes them on before the next window.
+
+Every worker builds the whole simulation from the same seed, so the peers, links and random streams
+(one per peer and purpose) are the same as in a single process run, and so are the results.
+"""
+import heapq
+import logging
+import math
+import multiprocessing
+import random
+import time
+from block import Block, validation_cache
+from transaction import Transaction, tx_ids
+from engine import TX_ARRIVAL, BLOCK_ARRIVAL
+from peer import Peer
+import topology
+
+logger = logging.getLogger(__name__)
+
+
+def transaction_record(transaction):
+    return (transaction.id, transaction.sender, transaction.receiver, transaction.amount, transaction.timestamp)
+
+
+def block_record(block, mined):
+    """
+    Returns what another process needs to rebuild block, mined at time mined
+    """
+    return (block.blkid, block.prevblock.blkid, block.timestamp, block.userid, mined,
+            [transaction_record(t) for t in block.transactions])
+
+
+def rebuild_block(record, blocks):
+    """
+    Rebuild the block of a record on top of its parent in blocks ({blkid: block}) and add it there
+    """
+    blkid, parent, timestamp, userid, mined, transactions = record
+    block = Block(blocks[parent], timestamp, set(Transaction(*t) for t in transactions), userid)
+    # The id is hashed from integers only, so it is the same in every process
+    assert block.blkid == blkid
+    blocks[blkid] = block
+    return block
+
+
+class ShardScheduler:
+    """
+    The scheduling interface of Engine for the peers of one worker
+    The deliveries to the peers of the other workers go to an outbox, as records, until the end of the window
+    """
+    def __init__(self, engine, local):
+        """
+        engine: Engine of the worker
+        local: ids of the peers of the worker
+        """
+        self.engine = engine
+        self.local = local
+        self.counts = engine.counts
+        self.outbox = [] # (arrival time, kind, receiver id, sender id, transaction record or blkid)
+
+    @property
+    def now(self):
+        return self.engine.now
+
+    def schedule(self, delay, kind, callback, payload):
+        receiver = callback.__self__
+        if (kind != TX_ARRIVAL and kind != BLOCK_ARRIVAL) or receiver.id in self.local:
+            self.engine.schedule(delay, kind, callback, payload)
+        elif kind == TX_ARRIVAL:
+            sender, transaction = payload
+            self.outbox.append((self.engine.now + delay, kind, receiver.id, sender.id, transaction_record(transaction)))
+        else:
+            sender, block = payload
+            self.outbox.append((self.engine.now + delay, kind, receiver.id, sender.id, block.blkid))
+
+
+class Worker:
+    """
+    The peers of one shard and their engine, in a worker process
+    """
+    def __init__(self, args, build, seed, shard, parts):
+        """
+        args: parsed arguments of run.py
+        build: run.build_simulation
+        seed: seed of the random module before building
+        shard: number of this worker
+        parts: part of every peer, from topology.partition
+        """
+        random.seed(seed)
+        validation_cache.reset()
+        tx_ids.reset()
+        self.env, self.peers, self.network = build(args)
+        self.local = {i for i, part in enumerate(parts) if part == shard}
+
+        # Only the events of the peers of this worker are run here
+        self.env.queue = [event for event in self.env.queue if isinstance(event[3].__self__, Peer) and event[3].__self__.id in self.local]
+        heapq.heapify(self.env.queue)
+        if self.network.replay is not None:
+            # Every worker has a workload driver, for the transactions of its own peers
+            self.network.replay.start(self.local)
+        self.scheduler = ShardScheduler(self.env, self.local)
+        self.network.scheduler = self.scheduler
+
+        genesis = self.peers[0].genesis
+        self.blocks = {genesis.blkid: genesis} # Every block mined so far, by any worker
+        self.scanned = 1 # Blocks of the tree already checked for new blocks mined here
+
+    def next_time(self):
+        """
+        Returns the time of the next event of this worker, infinity if there is none
+        """
+        return self.env.queue[0][0] if self.env.queue else math.inf
+
+    def receive(self, blocks, messages):
+        """
+        Add the blocks mined by the other workers and schedule the messages to the peers of this worker
+        """
+        # Validated right away, in the order they were mined, so that every block has its ledger when
+        # a local peer validates a child of it (blocks only come after their parent)
+        for record in blocks:
+            rebuild_block(record, self.blocks).validate()
+        for arrival, kind, receiver, sender, payload in messages:
+            receiver = self.peers[receiver]
+            sender = self.peers[sender]
+            if kind == TX_ARRIVAL and self.network.tx_gossip == "analytic":
+                self.env.schedule_at(arrival, kind, receiver.on_flooded_transaction, (sender, Transaction(*payload)))
+            elif kind == TX_ARRIVAL:
+                self.env.schedule_at(arrival, kind, receiver.on_transaction, (sender, Transaction(*payload)))
+            else:
+                self.env.schedule_at(arrival, kind, receiver.on_block, (sender, self.blocks[payload]))
+
+    def run(self, until):
+        """
+        Run the events before until
+
+        returns: records of the blocks mined, outgoing messages, time of the next event
+        """
+        self.env.run(until=until)
+
+        # The blocks of the tree not known yet were mined here
+        mined = []
+        block_tree = self.peers[0].block_tree
+        for index in range(self.scanned, len(block_tree.blocks)):
+            block = block_tree.blocks[index]
+            if block.blkid not in self.blocks:
+                self.blocks[block.blkid] = block
+                mined.append(block_record(block, self.peers[block.userid].arrivals[index]))
+        self.scanned = len(block_tree.blocks)
+
+        outbox = self.scheduler.outbox
+        self.scheduler.outbox = []
+        return mined, outbox, self.next_time()
+
+    def results(self):
+        """
+        Returns the final state of the peers of this worker, the events processed, the validate calls,
+        validations and ids of the blocks validated here, and the data sent by its peers
+        """
+        block_tree = self.peers[0].block_tree
+        peers = []
+        for i in sorted(self.local):
+            peer = self.peers[i]
+            arrivals = {block_tree.blocks[index].blkid: arrival for index, arrival in peer.arrivals.items()}
+            peers.append((peer.id, peer.num_gen, peer.balance, peer.longest_chain.blkid, arrivals))
+        return (peers, self.env.counts, validation_cache.calls, validation_cache.validations,
+                list(validation_cache.ledgers), self.network.block_kb)
+
+
+def work(connection, args, build, seed, shard, parts):
+    """
+    Main function of a worker process, runs the windows sent by the main process until it sends None
+    """
+    logging.disable(logging.INFO) # Every worker builds the same network, the main process logs it
+    worker = Worker(args, build, seed, shard, parts)
+    logging.disable(logging.NOTSET)
+    connection.send(worker.next_time())
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        until, blocks, messages = message
+        worker.receive(blocks, messages)
+        connection.send(worker.run(until))
+    connection.send(worker.results())
+    connection.close()
+
+
+def lookahead(network, parts):
+    """
+    Returns the smallest propagation delay of the links between peers of different parts, infinity if there is none
+    """
+    cut = [network.p[edge] for i, edges in enumerate(network.edge_index) for j, edge in edges.items() if parts[i] != parts[j]]
+    return min(cut, default=math.inf)
+
+
+def run(args, build):
+    """
+    Run a whole simulation with args.workers worker processes
+
+    args: parsed arguments of run.py, with the heap engine
+    build: run.build_simulation
+
+    returns: env, peers, network of the simulation built in this process and brought to the final
+             state of the workers (env is at the end of the run, with the events of all the workers)
+    """
+    start = time.perf_counter()
+    seed = args.seed if args.seed is not None else random.getrandbits(64)
+    random.seed(seed)
+    env, peers, network = build(args)
+    env.queue = [] # The events are run by the workers
+    parts = topology.partition(len(peers), network.indptr, network.indices, args.workers).tolist()
+    window = lookahead(network, parts)
+
+    connections = []
+    processes = []
+    for shard in range(args.workers):
+        connection, child = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=work, args=(child, args, build, seed, shard, parts), daemon=True)
+        process.start()
+        child.close()
+        connections.append(connection)
+        processes.append(process)
+    next_times = [connection.recv() for connection in connections]
+
+    # Windows are run back to back, skipping the times where no worker has anything to do
+    now = 0.0
+    windows = 0
+    messages = 0
+    records = []
+    inboxes = [[] for _ in connections]
+    new_blocks = [[] for _ in connections]
+    while now < args.time:
+        until = min(min(next_times) + window, args.time)
+        for shard, connection in enumerate(connections):
+            connection.send((until, new_blocks[shard], inboxes[shard]))
+        inboxes = [[] for _ in connections]
+        new_blocks = [[] for _ in connections]
+        for shard, connection in enumerate(connections):
+            mined, outbox, next_times[shard] = connection.recv()
+            records.extend(mined)
+            for other in range(len(connections)):
+                if other != shard:
+                    new_blocks[other].extend(mined)
+            for message in outbox:
+                inboxes[parts[message[2]]].append(message)
+                next_times[parts[message[2]]] = min(next_times[parts[message[2]]], message[0])
+            messages += len(outbox)
+        windows += 1
+        now = until
+
+    results = []
+    for connection in connections:
+        connection.send(None)
+        results.append(connection.recv())
+    for process in processes:
+        process.join()
+
+    # The blocks in the order they were mined, like in the tree of a single process run
+    genesis = peers[0].genesis
+    blocks = {genesis.blkid: genesis}
+    block_tree = peers[0].block_tree
+    for record in sorted(records, key=lambda record: record[4]):
+        block = rebuild_block(record, blocks)
+        block.validate()
+        block_tree.add(block)
+
+    # The validation summary counts the work of the workers, not the rebuild above
+    validation_cache.calls = 0
+    validation_cache.validations = 0
+    for worker_peers, counts, calls, validations, validated, block_kb in results:
+        for id, num_gen, balance, tip, arrivals in worker_peers:
+            peer = peers[id]
+            peer.num_gen = num_gen
+            peer.balance = balance
+            peer.longest_chain = blocks[tip]
+            peer.arrivals = {block_tree.index[blkid]: arrival for blkid, arrival in sorted(arrivals.items(), key=lambda item: item[1])}
+        for kind, count in enumerate(counts):
+            env.counts[kind] += count
+        validation_cache.calls += calls
+        validation_cache.validations += validations
+        for blkid in validated:
+            # The invalid blocks are not rebuilt here
+            validation_cache.ledgers.setdefault(blkid, None)
+        network.block_kb += block_kb
+    env.now = args.time
+
+    # Every worker validates all the blocks, the validation summary adds them up
+    logger.info("Sharded run : %s workers, lookahead %s ms, %s windows, %s messages between workers, %.1f s",
+                args.workers, window, windows, messages, time.perf_counter() - start)
+    return env, peers, network
@@ -0,0 +1,132 @@
+import argparse
+import concurrent.futures
+import csv
+import glob
+import itertools
+import logging
+import os
+import zlib
+
+import run
+import treeio
+
+PARAMETERS = ["n", "z0", "z1", "Ttx", "I", "time"]
+TYPES = {"n": int, "z0": float, "z1": float, "Ttx": float, "I": float, "time": float}
+
+
+def read_tree_summary(filename):
+    """
+    Read back the results of a peer from the header of a .tree file written by Peer.save_tree
+    """
+    result = {}
+    with open(filename) as f:
+        for line in f:
+            if " : " not in line:
+                break
+            key, value = [part.strip() for part in line.split(" : ", 1)]
+            if key == "Peer ID":
+                result["peer"] = int(value)
+            elif key == "CPU speed":
+                result["cpu"] = value
+            elif key == "Node speed":
+                result["speed"] = value
+            elif key == "Number of blocks created":
+                result["created"] = int(value)
+            elif key == "Number of blocks ending in longest chain":
+                result["longest"] = int(value)
+    return result
+
+
+def aggregate(results):
+    """
+    Aggregate the results of the peers of a run: number of blocks created, number ending in the
+    longest chain and their ratio, overall and per CPU and node speed category
+    """
+    row = {}
+    groups = {"all": results}
+    for key, values in (("cpu", ["high", "low"]), ("speed", ["fast", "slow"])):
+        for value in values:
+            groups[value] = [r for r in results if r[key] == value]
+    for name, group in groups.items():
+        created = sum(r["created"] for r in group)
+        longest = sum(r["longest"] for r in group)
+        row[f"created {name}"] = created
+        row[f"longest {name}"] = longest
+        row[f"ratio {name}"] = round(longest/created, 4) if created else ""
+    return row
+
+
+def config_seed(base_seed, config, replicate):
+    """
+    Seed of a run, derived from the configuration so that it does not depend on the order of the sweep
+    """
+    key = f"{base_seed}_" + "_".join(str(config[p]) for p in PARAMETERS) + f"_{replicate}"
+    return zlib.crc32(key.encode())
+
+
+def run_config(argv):
+    """
+    Run one simulation in a worker process
+
+    argv: command line arguments of run.py
+    """
+    logging.getLogger().setLevel(logging.WARNING) # Only the sweep itself reports progress
+    return run.run_simulation(run.parse_args(argv))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parameter sweep of the P2P currency simulator, extra arguments are passed to run.py")
+    parser.add_argument("--n", type=int, nargs="+", default=[10], help="numbers of peers")
+    parser.add_argument("--z0", type=float, nargs="+", default=[0.5], help="percents of slow peers")
+    parser.add_argument("--z1", type=float, nargs="+", default=[0.5], help="percents of low CPU peers")
+    parser.add_argument("--Ttx", type=float, nargs="+", default=[0.5], help="mean interarrival times of transactions")
+    parser.add_argument("--I", type=float, nargs="+", default=[0.5], help="mean interarrival times of blocks")
+    parser.add_argument("--time", type=float, nargs="+", default=[100], help="simulation times")
+    parser.add_argument("--replicates", type=int, default=1, help="runs per configuration, each with its own seed")
+    parser.add_argument("--seed", type=int, default=0, help="base seed of the sweep")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--summary", default="sweep_summary.csv", help="summary table of all the configurations")
+    args, extra = parser.parse_known_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    runs = []
+    for values in itertools.product(*[getattr(args, p) for p in PARAMETERS]):
+        config = {p: TYPES[p](v) for p, v in zip(PARAMETERS, values)}
+        for replicate in range(args.replicates):
+            suffix = f"_rep{replicate}" if args.replicates > 1 else ""
+            seed = config_seed(args.seed, config, replicate)
+            # The sweep already runs one simulation per worker, each one renders its trees in its own process
+            argv = [f"--{p}={config[p]}" for p in PARAMETERS] + ["--seed", str(seed), "--suffix", suffix, "--render-jobs", "1"] + extra
+            runs.append((config, replicate, seed, argv))
+
+    rows = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {}
+        for config, replicate, seed, argv in runs:
+            name = run.output_name(run.parse_args(argv))
+            existing = glob.glob(f"trees_{name}/*.tree")
+            if os.path.exists(f"trees_{name}/{treeio.FILENAME}"):
+                logging.info("Skipping %s, results already exist", name)
+                rows.append((config, replicate, seed, treeio.peer_results(f"trees_{name}/{treeio.FILENAME}")))
+            elif existing:
+                logging.info("Skipping %s, results already exist", name)
+                rows.append((config, replicate, seed, [read_tree_summary(f) for f in existing]))
+            else:
+                futures[pool.submit(run_config, argv)] = (config, replicate, seed)
+
+        for future in concurrent.futures.as_completed(futures):
+            config, replicate, seed = futures[future]
+            rows.append((config, replicate, seed, future.result()))
+            logging.info("Done %s replicate %s", config, replicate)
+
+    rows.sort(key=lambda row: ([row[0][p] for p in PARAMETERS], row[1]))
+    with open(args.summary, "w", newline="") as f:
+        writer = None
+        for config, replicate, seed, results in rows:
+            row = dict(config, replicate=replicate, seed=seed, peers=len(results))
+            row.update(aggregate(results))
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames=list(row.keys()))
+                writer.writeheader()
+            writer.writerow(row)
+    logging.info("Summary of %s runs written to %s", len(rows), args.summary)
@@ -0,0 +1,203 @@
+import numpy as np
+
+KINDS = ["random", "regular", "er", "scale-free"]
+
+
+def random_picks(n, rng, low=4, high=8):
+    """
+    The original topology: every peer picks between low and high random neighbors
+    (the links are undirected, so the actual degrees are higher)
+
+    returns: arrays of edge endpoints u, v
+    """
+    degrees = rng.integers(low, high + 1, n)
+    u = np.repeat(np.arange(n), degrees)
+    v = rng.integers(0, n - 1, len(u))
+    v += v >= u # Skip the peer itself
+    return u, v
+
+
+def random_regular(n, d, rng):
+    """
+    Random d-regular graph from the configuration model
+    Self loops and repeated edges are dropped, so a few peers end up with a degree below d
+
+    returns: arrays of edge endpoints u, v
+    """
+    stubs = np.repeat(np.arange(n), d)
+    if len(stubs) % 2 == 1:
+        stubs = stubs[:-1]
+    rng.shuffle(stubs)
+    return stubs[0::2], stubs[1::2]
+
+
+def erdos_renyi(n, d, rng):
+    """
+    Erdos-Renyi graph G(n, p) with p = d/(n - 1), i.e. mean degree d
+    The number of edges is drawn first and the pairs are then sampled, which is linear in the number of edges
+
+    returns: arrays of edge endpoints u, v
+    """
+    pairs = n*(n - 1)//2
+    m = rng.binomial(pairs, min(1.0, d/max(n - 1, 1)))
+    u = rng.integers(0, n, m)
+    v = rng.integers(0, n - 1, m)
+    v += v >= u
+    return u, v
+
+
+def scale_free(n, d, rng):
+    """
+    Barabasi-Albert preferential attachment graph, every new peer links to m = d/2 existing peers
+
+    returns: arrays of edge endpoints u, v
+    """
+    m = max(1, d//2)
+    m = min(m, n - 1)
+    # Each peer appears in targets once per edge it has, so sampling from it is proportional to the degree
+    targets = list(range(m))
+    u = []
+    v = []
+    for i in range(m, n):
+        if i == m:
+            chosen = set(range(m)) # The first peer links to all the initial ones
+        else:
+            chosen = set()
+            while len(chosen) < m:
+                chosen.add(targets[int(rng.integers(len(targets)))])
+        for j in chosen:
+            u.append(i)
+            v.append(j)
+            targets.append(i)
+            targets.append(j)
+    return np.array(u, dtype=np.int64), np.array(v, dtype=np.int64)
+
+
+def to_csr(n, u, v):
+    """
+    Build the CSR adjacency of the undirected graph with edges (u, v)
+    Self loops and repeated edges are removed
+
+    returns: indptr, indices (the neighbors of i are indices[indptr[i]:indptr[i+1]], sorted)
+    """
+    u = np.asarray(u, dtype=np.int64)
+    v = np.asarray(v, dtype=np.int64)
+    keep = u != v
+    src = np.concatenate([u[keep], v[keep]])
+    dst = np.concatenate([v[keep], u[keep]])
+    arcs = np.unique(src*n + dst)
+    src = arcs//n
+    indices = arcs % n
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+    return indptr, indices
+
+
+def components(n, indptr, indices):
+    """
+    Label the connected components with union-find
+
+    returns: array of component labels, one per peer (the root of its component)
+    """
+    parent = list(range(n))
+
+    def find(x):
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root: # Path compression
+            parent[x], x = root, parent[x]
+        return root
+
+    src = np.repeat(np.arange(n), np.diff(indptr))
+    upper = src < indices # Every edge once
+    for a, b in zip(src[upper].tolist(), indices[upper].tolist()):
+        ra = find(a)
+        rb = find(b)
+        if ra != rb:
+            parent[ra] = rb
+
+    return np.array([find(x) for x in range(n)])
+
+
+def bridge(n, indptr, indices, rng):
+    """
+    Connect the graph with the fewest edges: one edge between consecutive components
+
+    returns: indptr, indices of the connected graph, number of edges added
+    """
+    labels = components(n, indptr, indices)
+    order = rng.permutation(n)
+    roots, first = np.unique(labels[order], return_index=True)
+    if len(roots) <= 1:
+        return indptr, indices, 0
+
+    # A random member of every component, linked as a chain
+    picks = order[first]
+    src = np.repeat(np.arange(n), np.diff(indptr))
+    u = np.concatenate([src, picks[:-1]])
+    v = np.concatenate([indices, picks[1:]])
+    indptr, indices = to_csr(n, u, v)
+    return indptr, indices, len(roots) - 1
+
+
+def partition(n, indptr, indices, parts):
+    """
+    Split the peers into parts of (nearly) equal size, grown in breadth first order so that
+    neighbors tend to end up in the same part
+
+    returns: array of part numbers, one per peer
+    """
+    order = []
+    seen = np.zeros(n, dtype=bool)
+    indptr = indptr.tolist()
+    indices = indices.tolist()
+    for start in range(n):
+        if seen[start]:
+            continue
+        seen[start] = True
+        queue = [start]
+        for x in queue:
+            for y in indices[indptr[x]:indptr[x+1]]:
+                if not seen[y]:
+                    seen[y] = True
+                    queue.append(y)
+        order.extend(queue)
+
+    parts_of = np.zeros(n, dtype=np.int64)
+    parts_of[np.array(order, dtype=np.int64)] = np.arange(n)*parts//max(n, 1)
+    return parts_of
+
+
+def generate(kind, n, d, rng):
+    """
+    Generate the edges of a random topology
+
+    kind: one of KINDS
+    n: number of peers
+    d: mean degree (ignored by "random")
+    rng: numpy random generator
+
+    returns: arrays of edge endpoints u, v
+    """
+    if n < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    if kind == "random":
+        return random_picks(n, rng)
+    elif kind == "regular":
+        return random_regular(n, d, rng)
+    elif kind == "er":
+        return erdos_renyi(n, d, rng)
+    elif kind == "scale-free":
+        return scale_free(n, d, rng)
+    raise ValueError(f"Unknown topology {kind}")
+
+
+def build(kind, n, d, rng):
+    """
+    Generate a connected topology
+
+    returns: indptr, indices, number of bridging edges added
+    """
+    indptr, indices = to_csr(n, *generate(kind, n, d, rng))
+    return bridge(n, indptr, indices, rng)
@@ -1,22 +1,59 @@
+class TxIds:
+    """
+    Hands out integer transaction ids, shared by all the peers of a run
+    The k-th transaction of peer p gets p*2**32 + k, so an id does not depend on the order in which
+    the peers generate their transactions (which differs between the workers of a sharded run)
+    """
+    def __init__(self):
+        self.counts = {} # peer id -> number of ids handed out to it
+
+    def next(self, peer):
+        """
+        Returns a new transaction id for peer
+        """
+        k = self.counts.get(peer, 0)
+        self.counts[peer] = k + 1
+        return (peer << 32) | k
+
+    def reset(self):
+        """
+        Start again from 0, before starting a new run in the same process
+        """
+        self.counts = {}
+
+
+tx_ids = TxIds()
+
+
 class Transaction:
     """
     A transaction is a transfer of coins from one user to another.
     """
+    # No per-instance __dict__, there can be millions of transactions in a run
+    __slots__ = ("id", "sender", "receiver", "amount", "timestamp")
+
     def __init__(self, id, sender, receiver, amount, timestamp) -> None:
         """
-        :param id: The id of the transaction
-        :param sender: The sender of the transaction (who is paying)
-        :param receiver: The receiver of the transaction (who is receiving)
+        :param id: The id of the transaction (an int from tx_ids)
+        :param sender: The id of the sender of the transaction (who is paying)
+        :param receiver: The id of the receiver of the transaction (who is receiving)
         :param amount: The amount of coins transferred
         :param timestamp: The time of the transaction
         """
-        # Assume that sender and receiver are ids
         self.id = id
         self.sender = sender
         self.receiver = receiver
         self.amount = amount
         self.timestamp = timestamp
 
+    # Equal and hashed by id, so that sets of transactions iterate in the same order in every run
+    # (identity hashes follow memory addresses) and copies made in other processes are the same transaction
+    def __eq__(self, other):
+        return isinstance(other, Transaction) and self.id == other.id
+
+    def __hash__(self):
+        return hash(self.id)
+
     def __str__(self):
-        output = f"{self.id}: {self.sender.id} pays {self.receiver.id} {self.amount} coins"
+        output = f"{self.id}: {self.sender} pays {self.receiver} {self.amount} coins"
         return output
\ No newline at end of file
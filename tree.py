@@ -1,7 +1,51 @@
-class Node:
-    def __init__(self, block, timestamp):
-        # The timestamp is the time at which the block was received
-        self.block = block
-        self.timestamp = timestamp
+class BlockTree:
+    """
+    The block tree shared by all the peers of a run, every block is stored once under a small integer index
+    Each peer only records which blocks it has and when they arrived, {block index: arrival time}
+    """
+    def __init__(self, genesis):
+        """
+        genesis: genesis block, gets index 0
+        """
+        self.blocks = [] # index -> block
+        self.index = {} # blkid -> index
+        self.parent = [] # index -> index of the parent (-1 for the genesis block)
+        self.children = [] # index -> list of the indices of the children
+        self.add(genesis)
 
-        self.children = [] # List of nodes that are children of this node
\ No newline at end of file
+    def add(self, block):
+        """
+        Add a block whose parent is already in the tree, nothing is done if it is already there
+
+        returns: the index of the block
+        """
+        index = self.index.get(block.blkid)
+        if index is not None:
+            return index
+
+        index = len(self.blocks)
+        self.index[block.blkid] = index
+        self.blocks.append(block)
+        self.children.append([])
+        if block.prevblock is None:
+            self.parent.append(-1)
+        else:
+            parent = self.index[block.prevblock.blkid]
+            self.parent.append(parent)
+            self.children[parent].append(index)
+        return index
+
+    def dfs(self, arrivals):
+        """
+        Returns the indices of the blocks of a peer's view of the tree in depth first order
+
+        arrivals: {block index: arrival time} of the peer
+        """
+        order = []
+        stack = [0]
+        while stack:
+            index = stack.pop()
+            order.append(index)
+            # Reversed so that the children are visited in the order they were added
+            stack.extend(child for child in reversed(self.children[index]) if child in arrivals)
+        return order
\ No newline at end of file
@@ -0,0 +1,262 @@
+"""
+Columnar binary export of the block tree and of the arrival times of all the peers
+
+A file is a header followed by fixed-width arrays (written by write_columns), each one can be loaded with numpy.memmap:
+    magic "P2PTREE1", then the length of a JSON header as a little-endian uint64, then the JSON header
+    {"blocks": number of blocks, "peers": number of peers, "columns": [{"name", "dtype", "shape", "offset"}]}
+    and the arrays, each one starting at its offset (a multiple of ALIGNMENT) from the start of the file
+
+Block columns (one entry per block, in block tree order so parents come before children):
+    blkid, parent (index of the parent block, -1 for the genesis block), miner (-1 for the genesis block),
+    height, timestamp, transactions (number of transactions)
+Peer columns (one entry per peer):
+    peer (id), cpu (1 for high), speed (1 for fast), created (blocks created), longest (blocks created ending
+    in its longest chain), tip (index of the last block of its longest chain)
+arrivals: peers x blocks matrix of the times at which each peer received each block, NaN if it never did
+
+python3 treeio.py convert trees_10_0.5_0.5_100.0_600.0_20000.0   (text .tree files to trees.bin)
+python3 treeio.py summary trees_10_0.5_0.5_100.0_600.0_20000.0/trees.bin
+"""
+import argparse
+import glob
+import json
+import os
+import struct
+import numpy as np
+
+MAGIC = b"P2PTREE1"
+ALIGNMENT = 64
+FILENAME = "trees.bin" # Name of the file in the trees_ directory of a run
+
+BLOCK_COLUMNS = [("blkid", "<i8"), ("parent", "<i4"), ("miner", "<i4"), ("height", "<i4"), ("timestamp", "<f8"), ("transactions", "<i4")]
+PEER_COLUMNS = [("peer", "<i4"), ("cpu", "u1"), ("speed", "u1"), ("created", "<i4"), ("longest", "<i4"), ("tip", "<i4")]
+
+
+def write_columns(f, magic, header, arrays):
+    """
+    Write magic, the JSON header with the entries of the columns added to it, and the arrays, each one
+    at an offset that is a multiple of ALIGNMENT
+
+    f: file open for writing in binary mode, at its start
+    header: fields of the JSON header other than "columns"
+    arrays: list of (name, numpy array), or (name, (dtype, shape)) to only reserve the space of a column,
+            which is then filled through numpy.memmap at the offset of its entry
+    returns: the entries of the columns, [{"name", "dtype", "shape", "offset"}]
+    """
+    columns = []
+    for name, array in arrays:
+        if isinstance(array, np.ndarray):
+            columns.append((name, array.dtype, array.shape, array))
+        else:
+            dtype, shape = array
+            columns.append((name, np.dtype(dtype), tuple(shape), None))
+
+    # The offsets depend on the length of the header, which contains them, so grow it until they fit
+    size = 4096
+    while True:
+        entries = []
+        offset = size
+        for name, dtype, shape, _ in columns:
+            entries.append({"name": name, "dtype": dtype.str, "shape": list(shape), "offset": offset})
+            offset += -(-int(np.prod(shape))*dtype.itemsize//ALIGNMENT)*ALIGNMENT
+        encoded = json.dumps(dict(header, columns=entries)).encode()
+        if len(magic) + 8 + len(encoded) <= size:
+            break
+        size *= 2
+
+    f.write(magic + struct.pack("<Q", len(encoded)) + encoded)
+    for entry, (_, _, _, array) in zip(entries, columns):
+        if array is not None:
+            f.seek(entry["offset"])
+            f.write(np.ascontiguousarray(array).data)
+    f.truncate(offset) # Pads the last column and allocates the reserved ones
+    return entries
+
+
+def load_columns(filename, magic):
+    """
+    Map the arrays of a file written by write_columns, nothing is read until they are used
+
+    returns: header, {column name: read-only numpy memmap}
+    """
+    with open(filename, "rb") as f:
+        if f.read(len(magic)) != magic:
+            raise ValueError(f"{filename} is not a {magic.decode()} file")
+        length, = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(length))
+
+    columns = {}
+    for entry in header["columns"]:
+        if 0 in entry["shape"]:
+            columns[entry["name"]] = np.empty(entry["shape"], entry["dtype"]) # memmap cannot map nothing
+        else:
+            columns[entry["name"]] = np.memmap(filename, entry["dtype"], "r", entry["offset"], tuple(entry["shape"]))
+    return header, columns
+
+
+def write(filename, columns):
+    """
+    Write the arrays of columns, {name: numpy array}
+
+    columns: block and peer columns and the arrivals matrix
+    """
+    directory = os.path.dirname(filename)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    arrays = []
+    for name, dtype in BLOCK_COLUMNS + PEER_COLUMNS + [("arrivals", "<f8")]:
+        arrays.append((name, np.ascontiguousarray(columns[name], dtype=dtype)))
+    with open(filename, "wb") as f:
+        write_columns(f, MAGIC, {"blocks": len(columns["blkid"]), "peers": len(columns["peer"])}, arrays)
+
+
+def export(peers, filename):
+    """
+    Write the shared block tree and the arrival times of all the peers of a run to filename
+
+    returns: the results of every peer, as peer_results
+    """
+    block_tree = peers[0].block_tree
+    blocks = block_tree.blocks
+    columns = {
+        "blkid": np.fromiter((block.blkid for block in blocks), np.int64, len(blocks)),
+        "parent": np.array(block_tree.parent, np.int32),
+        "miner": np.fromiter((block.userid for block in blocks), np.int32, len(blocks)),
+        "height": np.fromiter((block.height for block in blocks), np.int32, len(blocks)),
+        "timestamp": np.fromiter((block.timestamp for block in blocks), np.float64, len(blocks)),
+        "transactions": np.fromiter((len(block.transactions) for block in blocks), np.int32, len(blocks)),
+        "peer": np.array([peer.id for peer in peers], np.int32),
+        "cpu": np.array([peer.cpu == "high" for peer in peers], np.uint8),
+        "speed": np.array([peer.speed == "fast" for peer in peers], np.uint8),
+        "created": np.array([peer.num_gen for peer in peers], np.int32),
+        "longest": np.array([peer.count_longest() for peer in peers], np.int32),
+        "tip": np.array([block_tree.index[peer.longest_chain.blkid] for peer in peers], np.int32),
+    }
+
+    arrivals = np.full((len(peers), len(blocks)), np.nan)
+    for row, peer in zip(arrivals, peers):
+        row[np.fromiter(peer.arrivals.keys(), np.int64, len(peer.arrivals))] = np.fromiter(peer.arrivals.values(), np.float64, len(peer.arrivals))
+    columns["arrivals"] = arrivals
+    write(filename, columns)
+    return [{"peer": peer.id, "cpu": peer.cpu, "speed": peer.speed, "created": peer.num_gen, "longest": int(longest)}
+            for peer, longest in zip(peers, columns["longest"])]
+
+
+def load(filename):
+    """
+    Map the arrays of a file written by export, nothing is read until they are used
+
+    returns: {column name: read-only numpy memmap}
+    """
+    _, columns = load_columns(filename, MAGIC)
+    return columns
+
+
+def peer_results(filename):
+    """
+    Returns the results of every peer of a file written by export, as run.run_simulation does
+    """
+    columns = load(filename)
+    return [{"peer": int(peer), "cpu": "high" if cpu else "low", "speed": "fast" if speed else "slow", "created": int(created), "longest": int(longest)}
+            for peer, cpu, speed, created, longest in zip(columns["peer"], columns["cpu"], columns["speed"], columns["created"], columns["longest"])]
+
+
+def read_text(filename):
+    """
+    Read a .tree text file written by Peer.save_tree
+
+    returns: header {key: value}, list of (block hash, parent hash or None, arrival time)
+    """
+    header = {}
+    blocks = []
+    with open(filename) as f:
+        lines = [line.strip() for line in f]
+    i = 0
+    while i < len(lines) and " : " in lines[i]:
+        key, value = [part.strip() for part in lines[i].split(" : ", 1)]
+        header.setdefault(key, value) # CPU and node speed are written twice
+        i += 1
+    block = None
+    for line in lines[i:]:
+        if " : " not in line:
+            continue
+        key, value = [part.strip() for part in line.split(" : ", 1)]
+        if key == "Block Hash":
+            block = [int(value), None, None]
+            blocks.append(block)
+        elif key == "Parent Hash":
+            block[1] = int(value)
+        elif key == "Received at":
+            block[2] = float(value)
+    return header, [tuple(block) for block in blocks]
+
+
+def convert(directory, filename=None):
+    """
+    Convert the .tree text files of a run to a single binary file (directory/trees.bin by default)
+    The text files do not have the miner, timestamp and number of transactions of the blocks,
+    they are -1, NaN and -1 in the binary file, heights are computed from the parents
+    """
+    files = glob.glob(os.path.join(directory, "*.tree"))
+    peers = [read_text(f) for f in files]
+    peers.sort(key=lambda peer: int(peer[0]["Peer ID"]))
+
+    # Number the blocks in the order they are met, parents are always written before their children
+    index = {}
+    parent = []
+    height = []
+    for _, blocks in peers:
+        for blkid, parent_blkid, _ in blocks:
+            if blkid not in index:
+                index[blkid] = len(parent)
+                parent.append(-1 if parent_blkid is None else index[parent_blkid])
+                height.append(0 if parent_blkid is None else height[index[parent_blkid]] + 1)
+
+    arrivals = np.full((len(peers), len(index)), np.nan)
+    tips = []
+    for row, (_, blocks) in zip(arrivals, peers):
+        for blkid, _, time in blocks:
+            row[index[blkid]] = time
+        # The tip of the longest chain is the first block received among the highest ones
+        seen = [index[blkid] for blkid, _, _ in blocks]
+        tips.append(min(seen, key=lambda i: (-height[i], row[i])))
+
+    n = len(index)
+    columns = {
+        "blkid": np.array(list(index.keys()), np.int64),
+        "parent": np.array(parent, np.int32),
+        "miner": np.full(n, -1, np.int32),
+        "height": np.array(height, np.int32),
+        "timestamp": np.full(n, np.nan),
+        "transactions": np.full(n, -1, np.int32),
+        "peer": np.array([int(header["Peer ID"]) for header, _ in peers], np.int32),
+        "cpu": np.array([header["CPU speed"] == "high" for header, _ in peers], np.uint8),
+        "speed": np.array([header["Node speed"] == "fast" for header, _ in peers], np.uint8),
+        "created": np.array([int(header["Number of blocks created"]) for header, _ in peers], np.int32),
+        "longest": np.array([int(header["Number of blocks ending in longest chain"]) for header, _ in peers], np.int32),
+        "tip": np.array(tips, np.int32),
+        "arrivals": arrivals,
+    }
+    write(filename or os.path.join(directory, FILENAME), columns)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Binary block tree files")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    parser_convert = subparsers.add_parser("convert", help="convert the .tree files of runs to trees.bin")
+    parser_convert.add_argument("directories", nargs="+", help="trees_ directories written by run.py --tree-format text")
+    parser_summary = subparsers.add_parser("summary", help="print the results of the peers of trees.bin files")
+    parser_summary.add_argument("files", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        for directory in args.directories:
+            convert(directory)
+            print(f"{directory} -> {os.path.join(directory, FILENAME)}")
+    else:
+        for filename in args.files:
+            columns = load(filename)
+            print(f"{filename} : {len(columns['blkid'])} blocks, {len(columns['peer'])} peers")
+            for result in peer_results(filename):
+                print(" ".join(f"{key} {value}" for key, value in result.items()))
@@ -0,0 +1,178 @@
+"""
+Transaction workloads generated up front and replayed by a single driver
+
+The transactions of all the peers form one superposed Poisson process of rate n/Ttx, in which every
+transaction is paid by a uniformly random peer (each peer generates at rate 1/Ttx, as in
+Peer.generate_transactions). It is generated vectorized, chunk by chunk of time: the number of
+transactions of a chunk is a Poisson draw, their times sorted uniform draws within the chunk.
+
+A file is laid out like trees.bin (written by treeio.write_columns), each array can be loaded with numpy.memmap:
+    magic "P2PWORK1", then the length of a JSON header as a little-endian uint64, then the JSON header
+    {"peers", "Ttx", "time", "seed", "transactions": number of transactions, "columns": [{"name", "dtype", "shape", "offset"}]}
+    and the arrays, each one starting at its offset (a multiple of treeio.ALIGNMENT) from the start of the file
+Columns (one entry per transaction, in time order): time, id (the row), sender, receiver, amount (1 to 5)
+
+python3 workload.py generate --n 10 --Ttx 1000000 --time 2880000 --seed 1 --output workload_10.bin
+python3 workload.py summary workload_10.bin
+python3 run.py --n 10 --z0 0.9 --z1 0.1 --I 6000 --time 2880000 --workload workload_10.bin
+"""
+import argparse
+import logging
+import os
+import numpy as np
+import treeio
+from transaction import Transaction
+from engine import TX_GENERATION
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"P2PWORK1"
+CHUNK = 1 << 20 # Expected number of transactions generated at once
+
+COLUMNS = [("time", "<f8"), ("id", "<i8"), ("sender", "<i4"), ("receiver", "<i4"), ("amount", "<i4")]
+
+
+def generate(filename, n, Ttx, time, seed=None):
+    """
+    Generate the transactions of n peers until time and write them to filename
+
+    n: number of peers, at least 2
+    Ttx: mean interarrival time of the transactions of a peer
+    seed: seed of the numpy generator, None to draw one from the operating system
+
+    returns: the number of transactions
+    """
+    if n < 2:
+        raise ValueError("a workload needs at least 2 peers")
+    rng = np.random.default_rng(seed)
+    rate = n/Ttx
+    chunks = max(1, int(np.ceil(rate*time/CHUNK)))
+    bounds = np.linspace(0, time, chunks + 1)
+    counts = rng.poisson(rate*np.diff(bounds))
+    total = int(counts.sum())
+
+    directory = os.path.dirname(filename)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    header = {"peers": n, "Ttx": Ttx, "time": time, "seed": seed, "transactions": total}
+    with open(filename, "wb") as f:
+        entries = treeio.write_columns(f, MAGIC, header, [(name, (dtype, (total,))) for name, dtype in COLUMNS])
+    if total == 0:
+        return 0
+
+    columns = {entry["name"]: np.memmap(filename, entry["dtype"], "r+", entry["offset"], (total,)) for entry in entries}
+    start = 0
+    for count, low, high in zip(counts.tolist(), bounds[:-1], bounds[1:]):
+        end = start + count
+        columns["time"][start:end] = np.sort(rng.uniform(low, high, count))
+        columns["id"][start:end] = np.arange(start, end)
+        senders = rng.integers(0, n, count)
+        receivers = rng.integers(0, n - 1, count)
+        receivers += receivers >= senders # Skip the sender itself
+        columns["sender"][start:end] = senders
+        columns["receiver"][start:end] = receivers
+        columns["amount"][start:end] = rng.integers(1, 6, count)
+        start = end
+    for column in columns.values():
+        column.flush()
+    return total
+
+
+def load(filename):
+    """
+    Map the arrays of a workload file, nothing is read until they are used
+
+    returns: header, {column name: read-only numpy memmap}
+    """
+    return treeio.load_columns(filename, MAGIC)
+
+
+class Replay:
+    """
+    Driver of the transactions of a workload file: a single event is pending at any time, the next
+    transaction, and rows are read from the file a chunk at a time
+    """
+    def __init__(self, filename, peers, network, chunk=4096):
+        """
+        filename: workload file written by generate, for len(peers) peers
+        peers: all the peers of the run
+        network: network of the run, whose scheduler runs the driver
+        chunk: number of rows read at once
+        """
+        self.filename = filename
+        self.header, self.columns = load(filename)
+        if self.header["peers"] != len(peers):
+            raise ValueError(f"{filename} is a workload for {self.header['peers']} peers, not {len(peers)}")
+        self.peers = peers
+        self.network = network
+        self.chunk = chunk
+        self.senders = None
+        self.rows = [] # Rows read from the file but not scheduled yet, in reverse order
+        self.position = 0 # Next row to read from the file
+
+    def __getstate__(self):
+        # Checkpoints keep the position in the file instead of the mapped arrays
+        state = self.__dict__.copy()
+        state["header"] = None
+        state["columns"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.header, self.columns = load(self.filename)
+
+    def start(self, senders=None):
+        """
+        Schedule the first transaction, from the beginning of the file
+
+        senders: replay only the transactions of these peers (the peers of a worker), all if None
+        """
+        self.senders = senders
+        self.rows = []
+        self.position = 0
+        self.schedule_next()
+
+    def schedule_next(self):
+        while True:
+            if not self.rows:
+                end = min(self.position + self.chunk, self.header["transactions"])
+                if end == self.position:
+                    return
+                rows = zip(*(self.columns[name][self.position:end].tolist() for name, _ in COLUMNS))
+                self.rows = list(rows)[::-1]
+                self.position = end
+            time, id, sender, receiver, amount = self.rows.pop()
+            if self.senders is None or sender in self.senders:
+                break
+        self.network.schedule(time - self.network.scheduler.now, TX_GENERATION, self.emit, time, id, sender, receiver, amount)
+
+    def emit(self, time, id, sender, receiver, amount):
+        """
+        Called at the time of a transaction, the sender gossips it and the next one is scheduled
+        """
+        self.peers[sender].publish_transaction(Transaction(id, sender, receiver, amount, time))
+        self.schedule_next()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transaction workload files")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    parser_generate = subparsers.add_parser("generate", help="generate the transactions of a run")
+    parser_generate.add_argument("--n", type=int, required=True, help="number of peers")
+    parser_generate.add_argument("--Ttx", type=float, required=True, help="mean interarrival time of the transactions of a peer")
+    parser_generate.add_argument("--time", type=float, required=True, help="simulation time")
+    parser_generate.add_argument("--seed", type=int, default=None, help="random seed")
+    parser_generate.add_argument("--output", required=True, help="workload file")
+    parser_summary = subparsers.add_parser("summary", help="print the header and the first transactions of workload files")
+    parser_summary.add_argument("files", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        total = generate(args.output, args.n, args.Ttx, args.time, args.seed)
+        print(f"{args.output} : {total} transactions")
+    else:
+        for filename in args.files:
+            header, columns = load(filename)
+            print(f"{filename} : {header['transactions']} transactions of {header['peers']} peers, Ttx {header['Ttx']}, time {header['time']}, seed {header['seed']}")
+            for row in zip(*(columns[name][:5].tolist() for name, _ in COLUMNS)):
+                print(" ".join(f"{name} {value}" for (name, _), value in zip(COLUMNS, row)))